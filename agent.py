@@ -1,18 +1,106 @@
 """
 agent.py  – CodeTransformationAgent
-Wraps ACTIONS so policy can call propose(code, action_id).
+Wraps ACTIONS so policy can call propose(code, action_id) / apply(state, action_id).
 """
 import ast
-from transformation import ACTIONS
+from transformation import ACTIONS, find_matches, apply_match
+from profiler import PROFILE
+
+class CodeState:
+    """
+    函数的工作 AST；源码串和 code object 按需从树生成并缓存。
+    树被一个 state 独占时规则原地改写，fork() 共享后第一次改写才复制（copy-on-write）。
+    约定：ACTIONS 里的规则返回 False 时不得修改 fn。
+    """
+    def __init__(self, src=None, fn=None):
+        self._src, self._fn, self._code = src, fn, None
+        self.owned = True
+        self.feat = None                     # reward_model._feat 的缓存
+        self.matches = None                  # find_matches 的缓存（引用的是 self._fn 里的节点）
+        self.mask = None
+
+    @property
+    def fn(self):
+        if self._fn is None:
+            with PROFILE.stage("parse"): self._fn = ast.parse(self._src).body[0]
+        return self._fn
+
+    @property
+    def src(self):
+        if self._src is None:
+            with PROFILE.stage("unparse"): self._src = ast.unparse(self._fn)
+        return self._src
+
+    @property
+    def code(self):
+        if self._code is None:
+            mod = ast.Module(body=[self.fn], type_ignores=[])
+            with PROFILE.stage("compile"): self._code = compile(mod, "<candidate>", "exec")
+        return self._code
+
+    def __len__(self):
+        return len(self.src)
+
+    def fork(self):
+        twin = CodeState(self._src, self._fn)
+        twin._code, twin.feat, twin.mask = self._code, self.feat, self.mask
+        twin.matches = self.matches
+        self.owned = twin.owned = False
+        return twin
+
+    def transform(self, rule):
+        """对树应用 rule，返回 (新 state, changed)；改写后旧 state 只保留源码。"""
+        if self.owned:
+            self.src                          # 先固化旧源码，再把树交给新 state
+            fn = self.fn
+        else:
+            with PROFILE.stage("parse"):      # 共享的树：重新 parse 比深拷贝 AST 更快
+                fn = ast.parse(self.src).body[0]
+        with PROFILE.stage("rule"):
+            changed = rule(fn)
+        if not changed:
+            return self, False
+        if fn is self._fn:
+            # 树交给了新 state：缓存的匹配位置指向的是那棵树，旧 state 下次用时重新 parse / 匹配
+            self._fn = self._code = self.matches = self.mask = None
+        return CodeState(fn=fn), True
 
 class CodeTransformationAgent:
     def __init__(self):
         self.n_actions = len(ACTIONS)
 
-    def propose(self, code_str: str, action_id: int):
+    def matches(self, state: CodeState):
+        """每个动作在 state 上的全部匹配位置（建一次索引，结果缓存在 state 上）。"""
+        if state.matches is None:
+            fn = state.fn
+            with PROFILE.stage("match"): state.matches = find_matches(fn)
+        return state.matches
+
+    def mask(self, state: CodeState):
+        """哪些动作会改变 state。"""
+        if state.mask is None:
+            state.mask = [bool(ms) for ms in self.matches(state)]
+        return state.mask
+
+    def targets(self, state: CodeState):
+        """所有 (action_id, target) 对，每个匹配位置一个。"""
+        return [(k, j) for k, ms in enumerate(self.matches(state)) for j in range(len(ms))]
+
+    def apply(self, state: CodeState, action_id: int, target: int = 0):
         if action_id < 0 or action_id >= self.n_actions:
             raise ValueError("invalid action id")
-        tree = ast.parse(code_str)
-        fn = tree.body[0]
-        changed = ACTIONS[action_id](fn)
-        return ast.unparse(fn) if changed else code_str, changed
+        sites = self.matches(state)[action_id]
+        if target >= len(sites):
+            return state, False                 # no-op，不必碰树
+        rule = ACTIONS[action_id]
+
+        def rewrite(fn):
+            # 独占的树直接用缓存的位置；共享的树被复制后要在副本上重新定位
+            ms = sites if fn is state._fn else find_matches(fn)[action_id]
+            return apply_match(fn, rule, ms[target])
+        return state.transform(rewrite)
+
+    def propose(self, code_str: str, action_id: int):
+        with PROFILE.stage("propose"):
+            new, changed = self.apply(CodeState(code_str), action_id)
+            return new.src if changed else code_str, changed
@@ -0,0 +1,262 @@
+"""
+bench.py  – 优化器自身热点路径的基准测试
+
+    python bench.py --out bench.json                       # 跑一遍，写 JSON
+    python bench.py --out bench.json --baseline base.json  # 和基线比，慢了就标 REGRESSION
+    python bench.py --quick --save-baseline base.json      # 生成 / 覆盖基线
+
+覆盖 CodeTransformationAgent.propose / apply、ACTIONS 里每条规则、_feat、
+PairwiseRewardModel.fit / score / score_batch、CodeOptimizeEnv.step（有无改动、缓存冷热、
+是否计时）、train.py 同款循环的端到端 episode 耗时（冷缓存时另测每步都计时的对照），
+以及 REINFORCE / PPO 在同样墙钟预算下到达目标回报的秒数；在规模递增的合成语料上跑。
+所有结果都是「每次调用的秒数」（越小越好），比较时按 median 之比判断回归。
+"""
+import argparse, ast, json, platform, random, statistics, sys, time, numpy as np, torch
+from torch.distributions import Categorical
+from agent import CodeTransformationAgent, CodeState
+from env import CodeOptimizeEnv
+from functions import functions, cases
+from corpus import DictCorpus
+from policy import PolicyNet
+from reward_model import PairwiseRewardModel, _feat, _feat_cache
+from rollout import RolloutBuffer, StepBuffer
+from train_ppo import cfg as ppo_cfg, act as ppo_act, ppo_update
+from transformation import ACTIONS, find_matches, bind_locals
+
+# -------- 合成语料 --------
+PATTERNS = [
+    "t{k} = 0\nfor x in lst:\n    t{k} += x\nreturn t{k}",
+    "m{k} = lst[0]\nfor x in lst:\n    if x > m{k}:\n        m{k} = x\nreturn m{k}",
+    "r{k} = []\nfor x in lst:\n    r{k}.append(x * {k})\nreturn r{k}",
+    "if flag > {k}:\n    return True\nelse:\n    return False",
+]
+
+def synth_function(i, n_stmts, rnd):
+    """约 n_stmts 条语句：docstring + 若干 `if flag == k:` 分支，每个分支里放一种可改写的模式。"""
+    lines, k = [f"def f{i}(lst, flag):", '    """synthetic"""'], 0
+    while len(lines) < n_stmts:
+        body = rnd.choice(PATTERNS).format(k=k)
+        lines.append(f"    value_{k} = flag * {k}")
+        lines.append(f"    if flag == {k}:")
+        lines += ["        " + l for l in body.splitlines()]
+        k += 1
+    lines.append("    return None")
+    return "\n".join(lines) + "\n"
+
+def synth_corpus(n_funcs, n_stmts, seed=0):
+    rnd = random.Random(seed)
+    return [synth_function(i, n_stmts, rnd) for i in range(n_funcs)]
+
+# -------- 计时 --------
+def bench(fn, setup=None, min_time=0.2, max_n=10000):
+    """逐次计时 fn(*setup())，setup 不计入；返回 {"median", "iqr", "n"}（秒/次）。"""
+    samples, start = [], time.perf_counter()
+    while len(samples) < max_n and (time.perf_counter() - start < min_time or len(samples) < 5):
+        args = setup() if setup else ()
+        s = time.perf_counter(); fn(*args); samples.append(time.perf_counter() - s)
+    q = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    return {"median": statistics.median(samples), "iqr": q[2] - q[0], "n": len(samples)}
+
+# -------- 各项基准 --------
+def bench_agent(res, lengths, min_time):
+    ct = CodeTransformationAgent()
+    for L in lengths:
+        srcs = synth_corpus(20, L)
+        rnd = random.Random(0)
+        res[f"agent.propose/len{L}"] = bench(
+            lambda s, a: ct.propose(s, a),
+            lambda: (rnd.choice(srcs), rnd.randrange(len(ACTIONS))), min_time)
+        res[f"agent.apply/len{L}"] = bench(
+            lambda st, a: ct.apply(st, a),
+            lambda: (CodeState(rnd.choice(srcs)), rnd.randrange(len(ACTIONS))), min_time)
+        res[f"find_matches/len{L}"] = bench(
+            find_matches, lambda: (ast.parse(rnd.choice(srcs)).body[0],), min_time)
+        for rule in ACTIONS:
+            res[f"rule.{rule.__name__}/len{L}"] = bench(
+                rule, lambda: (ast.parse(rnd.choice(srcs)).body[0],), min_time)
+        res[f"_feat/cold/len{L}"] = bench(
+            lambda s: (_feat_cache.clear(), _feat(s)), lambda: (rnd.choice(srcs),), min_time)
+        res[f"_feat/warm/len{L}"] = bench(_feat, lambda: (rnd.choice(srcs),), min_time)
+
+def bench_corpus(res, sizes, min_time):
+    for n in sizes:
+        srcs = synth_corpus(n, 40)
+        res[f"corpus.analyze/n{n}"] = bench(
+            lambda: [find_matches(ast.parse(s).body[0]) for s in srcs], min_time=min_time, max_n=20)
+
+def bench_reward_model(res, sizes, min_time):
+    srcs = synth_corpus(50, 30)
+    rnd = random.Random(0)
+    for n in sizes:
+        rm = PairwiseRewardModel(capacity=max(sizes))
+        for _ in range(n):
+            a, b = rnd.sample(srcs, 2); rm.add(a, b, len(b) < len(a))
+        def fit():
+            rm.fitted = 0; rm.fit(background=False)
+        res[f"rm.fit/n{n}"] = bench(fit, min_time=min_time, max_n=50)
+        pairs = [tuple(rnd.sample(srcs, 2)) for _ in range(256)]
+        res[f"rm.score/n{n}"] = bench(rm.score, lambda: rnd.choice(pairs), min_time)
+        res[f"rm.score_batch256/n{n}"] = bench(rm.score_batch, lambda: (pairs,), min_time)
+
+def bench_env(res, min_time):
+    cfg = dict(alpha=0.8, beta=0.2, max_steps=10)
+    env = CodeOptimizeEnv(DictCorpus(functions, cases), cfg)
+    def at(name):
+        env.reset(list(functions).index(name))
+    def unchanged():
+        at("sum_list"); return (env.action_mask().tolist().index(False),)
+    def changed_cold():
+        at("sum_list"); env.cache.clear(); return (2,)
+    def changed_warm():
+        at("sum_list"); return (2,)
+    def untimed_cold():                         # 估计的加速在阈值以内：只验证不计时
+        at("double_list"); env.cache.clear(); return (ACTIONS.index(bind_locals),)
+    res["env.step/unchanged"] = bench(env.step, unchanged, min_time)
+    res["env.step/changed_cold"] = bench(env.step, changed_cold, min_time, max_n=200)
+    cfg["timing_frac"] = 0.0
+    res["env.step/changed_cold_untimed"] = bench(env.step, untimed_cold, min_time, max_n=200)
+    res["env.step/changed_warm"] = bench(env.step, changed_warm, min_time)
+    env.close()
+
+def _reinforce(env, cfg):
+    """train.py 同款 REINFORCE（单 env）：采样 + step + 每 batch 一次更新，逐个产出 episode 回报。"""
+    policy = PolicyNet(1, len(ACTIONS))
+    opt = torch.optim.Adam(policy.parameters(), lr=5e-4)
+    buf = RolloutBuffer(1, cfg["max_steps"], 1, len(ACTIONS), cfg["batch"])
+    ep = 0
+    while True:
+        s, done = env.reset(), False
+        while not done:
+            m = env.action_mask(); m = m | ~m.any()
+            with torch.no_grad():
+                a = Categorical(probs=policy(torch.as_tensor(s)[None]) * torch.as_tensor(m)).sample()
+            s2, r, done, _ = env.step(int(a))
+            buf.add(s[None], m[None], a, [r]); s = s2
+        yield buf.finish(0)
+        ep += 1
+        if ep % cfg["batch"] == 0:
+            o, m, a, ep_id, G = buf.batch()
+            dist = Categorical(probs=policy(o) * m)
+            loss = (-dist.log_prob(a) * (G - G.mean())[ep_id] - 0.01 * dist.entropy()).sum() / len(G)
+            opt.zero_grad(); loss.backward(); opt.step(); buf.clear()
+
+def _ppo(env, cfg):
+    """train_ppo.py 同款 PPO（单 env），逐个产出 episode 回报。"""
+    policy = PolicyNet(1, len(ACTIONS), value=True)
+    opt = torch.optim.Adam(policy.parameters(), lr=ppo_cfg["lr"])
+    buf = StepBuffer(ppo_cfg["n_steps"], 1, 1, len(ACTIONS))
+    s, G = env.reset()[None], 0.0
+    while True:
+        m = env.action_mask()[None]; m = m | ~m.any()
+        a, logp, v = ppo_act(policy, s, m)
+        s2, r, done, _ = env.step(int(a))
+        buf.add(s, m, a, logp, [r], [done], v)
+        G += r
+        if done:
+            yield G
+            s2, G = env.reset(), 0.0
+        s = s2[None]
+        if buf.full():
+            with torch.no_grad(): last = policy.heads(torch.as_tensor(s).float())[1]
+            ppo_update(policy, opt, buf, last, ppo_cfg)
+
+def bench_episode(res, episodes, name="e2e.episode", cold=False, **extra):
+    """
+    REINFORCE 循环每个 episode 的秒数。
+    cold=True 时每个 episode 清空评估缓存，模拟大语料上几乎每步都是新代码的情形。
+    """
+    cfg = dict(alpha=0.8, beta=0.2, max_steps=10, batch=20, **extra)
+    env = CodeOptimizeEnv(DictCorpus(functions, cases), cfg)
+    random.seed(0); torch.manual_seed(0)
+    run = _reinforce(env, cfg)
+    start = time.perf_counter()
+    for ep in range(episodes):
+        if cold: env.cache.clear()
+        next(run)
+    per = (time.perf_counter() - start) / episodes
+    res[name] = {"median": per, "iqr": 0.0, "n": episodes}
+    env.close()
+
+def bench_learning(res, seconds, window=100):
+    """
+    REINFORCE 与 PPO 各训练 seconds 秒墙钟（同一 env 配置、同一种子），比谁先到达目标回报：
+    目标是两者 window 滑动平均回报里最好水平的 90%。结果是到达目标的秒数（没到达记为 seconds）。
+    """
+    cfg = dict(alpha=0.8, beta=0.2, max_steps=10, batch=20)
+    curves = {}
+    for algo, run in (("reinforce", _reinforce), ("ppo", _ppo)):
+        env = CodeOptimizeEnv(DictCorpus(functions, cases), cfg)
+        random.seed(0); np.random.seed(0); torch.manual_seed(0)
+        pts, start = [], time.perf_counter()
+        for G in run(env, cfg):
+            pts.append((time.perf_counter() - start, G))
+            if pts[-1][0] > seconds: break
+        env.close()
+        t, g = np.array(pts).T
+        curves[algo] = t[window - 1:], np.convolve(g, np.ones(window) / window, "valid")
+    target = 0.9 * max(ma.max() for _, ma in curves.values())
+    for algo, (t, ma) in curves.items():
+        hit = np.flatnonzero(ma >= target)
+        reach = float(t[hit[0]]) if len(hit) else float(seconds)
+        res[f"learn.{algo}/reach"] = {"median": reach, "iqr": 0.0, "n": len(ma) + window - 1}
+        print(f"[learn] {algo:<9} episodes={len(ma) + window - 1:<5} final_R={ma[-1]:7.2f} "
+              f"target={target:.2f} reached_at={reach:.1f}s", file=sys.stderr)
+
+# -------- 比较 --------
+def compare(res, base, tol):
+    """返回回归项 [(name, ratio)]；ratio = 当前 / 基线。"""
+    bad = []
+    for name, r in sorted(res.items()):
+        b = base.get(name)
+        if not b: continue
+        ratio = r["median"] / b["median"] if b["median"] > 0 else 1.0
+        flag = "REGRESSION" if ratio > 1 + tol else ("faster" if ratio < 1 / (1 + tol) else "")
+        print(f"{name:<42} {b['median']*1e6:>12.2f}us {r['median']*1e6:>12.2f}us  x{ratio:5.2f} {flag}")
+        if ratio > 1 + tol: bad.append((name, ratio))
+    return bad
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="benchmarks for the optimizer's own hot paths")
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--baseline", help="与该 JSON 比较")
+    ap.add_argument("--save-baseline", help="把本次结果另存为基线")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="median 变慢超过该比例算回归")
+    ap.add_argument("--quick", action="store_true")
+    ap.add_argument("--only", help="只跑名字包含该子串的组：agent / corpus / rm / env / e2e / learn")
+    args = ap.parse_args(argv)
+
+    q = args.quick
+    lengths, sizes, rm_sizes = ([10, 50], [10, 100], [100, 1000]) if q else \
+                               ([10, 50, 200], [10, 100, 1000], [100, 1000, 10000])
+    min_time, episodes, seconds = (0.05, 40, 15) if q else (0.3, 200, 90)
+    groups = {"agent": lambda r: bench_agent(r, lengths, min_time),
+              "corpus": lambda r: bench_corpus(r, sizes, min_time),
+              "rm": lambda r: bench_reward_model(r, rm_sizes, min_time),
+              "env": lambda r: bench_env(r, min_time),
+              "e2e": lambda r: (bench_episode(r, episodes),
+                                bench_episode(r, episodes, "e2e.episode/cold", cold=True),
+                                bench_episode(r, episodes, "e2e.episode/cold_timed",
+                                              cold=True, cost_model=False)),
+              "learn": lambda r: bench_learning(r, seconds)}
+    res = {}
+    for g, run in groups.items():
+        if args.only and args.only not in g: continue
+        t = time.perf_counter(); run(res)
+        print(f"[{g}] {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    out = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                    "torch": torch.__version__, "numpy": np.__version__,
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": q},
+           "results": res}
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, "w") as f: json.dump(out, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f: base = json.load(f)["results"]
+        bad = compare(res, base, args.tolerance)
+        print(f"{len(bad)} regression(s)", file=sys.stderr)
+        sys.exit(1 if bad else 0)
+    for name, r in sorted(res.items()):
+        print(f"{name:<42} {r['median']*1e6:>12.2f}us  ±{r['iqr']*1e6:.2f}  n={r['n']}")
+
+if __name__ == "__main__":
+    main()
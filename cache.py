@@ -0,0 +1,43 @@
+"""
+cache.py  – EvalCache
+有界 LRU：(函数名, 归一化源码 hash) → {"fn": 编译后函数, "rt": 运行时间, "ok": 正确性}。
+同一代码状态重复出现时，编译 / 计时 / 单元测试都只做一次。
+"""
+import hashlib
+from collections import OrderedDict
+
+def normalize(code: str) -> str:
+    # 只去掉空行和行尾空白，不做 parse，保证查表本身足够便宜
+    return "\n".join(l.rstrip() for l in code.splitlines() if l.strip())
+
+def code_hash(code: str) -> str:
+    return hashlib.blake2b(normalize(code).encode(), digest_size=16).hexdigest()
+
+class EvalCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def entry(self, name: str, code: str) -> dict:
+        """取 (name, code) 对应的条目，不存在则新建；调用方按需填 fn / rt / ok。"""
+        key = (name, code_hash(code))
+        e = self.data.get(key)
+        if e is not None:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return e
+        self.misses += 1
+        e = self.data[key] = {}
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+        return e
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> dict:
+        n = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self.data), "hit_rate": self.hits / n if n else 0.0}
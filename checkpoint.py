@@ -0,0 +1,73 @@
+"""
+checkpoint.py  – 可续训的完整训练状态，后台线程落盘
+每个 checkpoint 两个文件：
+    policy_ep{N}.pt   只有 policy.state_dict()（load_policy / optimize.py 直接用）
+    state_ep{N}.pt    续训用的全部状态：优化器、reward model 样本、hist、RNG、episode 计数……
+都先写 .tmp 再 os.replace，崩溃时目录里只会有完整的文件；超过 keep 个时删最旧的。
+"""
+import copy, glob, os, queue, re, threading, torch
+
+_EP = re.compile(r"state_ep(\d+)\.pt$")
+
+def _atomic_save(obj, path):
+    torch.save(obj, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def episodes(ckpt_dir):
+    """目录里已有的完整 checkpoint 的 episode 号（升序）。"""
+    eps = []
+    for p in glob.glob(os.path.join(ckpt_dir, "state_ep*.pt")):
+        m = _EP.search(p)
+        if m: eps.append(int(m.group(1)))
+    return sorted(eps)
+
+def latest(ckpt_dir):
+    eps = episodes(ckpt_dir)
+    return os.path.join(ckpt_dir, f"state_ep{eps[-1]}.pt") if eps else None
+
+def load(path):
+    # 里面有 numpy RNG 状态和 sklearn 对象，不能用 weights_only
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+class Checkpointer:
+    """save() 在调用线程里只做深拷贝，序列化和写盘交给后台线程；同一时刻最多排队一个。"""
+    def __init__(self, ckpt_dir="checkpoints", keep=5):
+        self.dir, self.keep = ckpt_dir, keep
+        os.makedirs(ckpt_dir, exist_ok=True)
+        self.q = queue.Queue(maxsize=1)
+        self.error = None
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def save(self, ep, state):
+        """state 里必须有 "policy"；返回 state 文件路径（写盘可能还没完成）。"""
+        if self.error: raise self.error
+        state = copy.deepcopy(state)         # 训练马上会改参数，先拍快照
+        self.q.put((ep, state))              # 上一个还没写完就在这里等
+        return os.path.join(self.dir, f"state_ep{ep}.pt")
+
+    def _loop(self):
+        while True:
+            item = self.q.get()
+            try:
+                if item is None: return
+                ep, state = item
+                _atomic_save(state["policy"], os.path.join(self.dir, f"policy_ep{ep}.pt"))
+                _atomic_save(state, os.path.join(self.dir, f"state_ep{ep}.pt"))
+                self._prune()
+            except Exception as e:           # 下一次 save() / close() 时抛给训练线程
+                self.error = e
+            finally:
+                self.q.task_done()
+
+    def _prune(self):
+        for ep in episodes(self.dir)[:-self.keep] if self.keep else []:
+            for kind in ("state", "policy"):
+                try: os.remove(os.path.join(self.dir, f"{kind}_ep{ep}.pt"))
+                except FileNotFoundError: pass
+
+    def close(self):
+        """等排队的 checkpoint 写完。"""
+        self.q.put(None)
+        self._thread.join()
+        if self.error: raise self.error
@@ -0,0 +1,3 @@
+# 让 pytest 从仓库根目录导入顶层模块（agent、transformation …）
+import os, sys
+sys.path.insert(0, os.path.dirname(__file__))
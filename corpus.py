@@ -0,0 +1,227 @@
+"""
+corpus.py  – 函数语料：按需读取、按需算参考输出、按 worker 分片
+
+    load_corpus(functions)            # dict：名字 → 源码（可另给 cases）
+    load_corpus("corpus.jsonl")       # 每行 {"name", "source", "tests": [[arg, ...], ...], "perf": [arg, ...]}
+    load_corpus("src/")               # 每个 .py 取第一个顶层函数，同名 .json 里可放 tests / perf
+
+条目只在被抽到时才读；JSONL 的行偏移索引第一次打开时建好存在 <path>.idx.npy，
+之后 memmap 打开，启动时间与条目数无关。tests / perf 缺省时按参数个数从
+INPUT_POOL 猜，只保留参考实现不抛异常的输入。References 是参考输出的有界 LRU。
+"""
+import ast, hashlib, itertools, json, os, pickle, random, numpy as np
+from collections import OrderedDict
+from sandbox import run_cases
+
+# 差分验证用的输入池：每个参数从里面取值
+INPUT_POOL = [[3, 1, 2], list(range(50)), [], [1.5, -2.0, 0.5], "Bob", "", 0, 7, -3, 2.5,
+              True, None, {"a": 1, "b": 2}, (4, 5)]
+
+def guess_cases(fn, n_cases=24, seed=0):
+    """按必填位置参数个数从 INPUT_POOL 组合候选输入；有必填的仅关键字 / 仅位置参数时放弃。"""
+    a = fn.args
+    if any(d is None for d in a.kw_defaults) or a.posonlyargs:
+        return []
+    n = len(a.args) - len(a.defaults)
+    if n == 0: return [()]
+    rnd = random.Random(seed)
+    cases = [(v,) * n for v in INPUT_POOL]
+    combos = list(itertools.product(range(len(INPUT_POOL)), repeat=n)) if n <= 2 else []
+    rnd.shuffle(combos)
+    for c in combos[:n_cases]:
+        cases.append(tuple(INPUT_POOL[i] for i in c))
+    for _ in range(n_cases if n > 2 else 0):
+        cases.append(tuple(rnd.choice(INPUT_POOL) for _ in range(n)))
+    return cases
+
+def iter_files(paths):
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for f in sorted(files):
+                    if f.endswith(".py"): yield os.path.join(root, f)
+        else:
+            yield p
+
+def perf_case(cases):
+    return max(cases, key=lambda c: len(repr(c)))   # 用最大的输入计时
+
+def _entry(name, source, tests=None, perf=None):
+    return {"name": name, "source": source,
+            "tests": None if tests is None else [tuple(t) for t in tests],
+            "perf": None if perf is None else tuple(perf)}
+
+# -------- 语料 --------
+class Corpus:
+    """len() + entry(i) → {"name", "source", "tests", "perf"}（tests / perf 可为 None）；条目不可用时为 None。"""
+    def __len__(self):
+        raise NotImplementedError
+
+    def entry(self, i):
+        raise NotImplementedError
+
+    def shard(self, k, n):
+        return Shard(self, k, n)
+
+class Shard(Corpus):
+    """第 k 个分片（共 n 个）：下标 k, k+n, k+2n, ...，不物化下标表。"""
+    def __init__(self, base, k, n):
+        self.base, self.k, self.n = base, k, n
+
+    def __len__(self):
+        return max(0, (len(self.base) - self.k + self.n - 1) // self.n)
+
+    def entry(self, i):
+        return self.base.entry(self.k + i * self.n)
+
+class DictCorpus(Corpus):
+    """functions.py 那样的 {名字: 源码}；cases 为 {名字: {"tests": [...], "perf": (...)}}。"""
+    def __init__(self, funcs, cases=None):
+        self.funcs, self.cases, self.names = funcs, cases or {}, list(funcs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def entry(self, i):
+        n = self.names[i]
+        c = self.cases.get(n, {})
+        return _entry(n, self.funcs[n], c.get("tests"), c.get("perf"))
+
+def _line_index(path, chunk=1 << 24):
+    """非空行的起始偏移（int64）；缓存在 <path>.idx.npy，数据文件更新后重建。"""
+    idx_path = path + ".idx.npy"
+    if os.path.exists(idx_path) and os.path.getmtime(idx_path) >= os.path.getmtime(path):
+        return np.load(idx_path, mmap_mode="r")
+    starts, ends, pos = [np.zeros(1, np.int64)], [], 0
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(chunk)
+            if not buf: break
+            nl = np.flatnonzero(np.frombuffer(buf, np.uint8) == 10).astype(np.int64) + pos
+            ends.append(nl); starts.append(nl + 1)
+            pos += len(buf)
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends + [np.array([pos], np.int64)])
+    starts = starts[ends > starts]                    # 去掉空行和文件末尾
+    try:
+        with open(idx_path + ".tmp", "wb") as f: np.save(f, starts)
+        os.replace(idx_path + ".tmp", idx_path)
+    except OSError:                                   # 只读目录：索引只留在内存里
+        pass
+    return starts
+
+class JsonlCorpus(Corpus):
+    def __init__(self, path):
+        self.path = path
+        self.offsets = _line_index(path)
+        self._f = self._pid = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def entry(self, i):
+        if self._pid != os.getpid():                  # fork 之后每个进程自己开文件
+            self._f, self._pid = open(self.path, "rb"), os.getpid()
+        self._f.seek(int(self.offsets[i]))
+        d = json.loads(self._f.readline())
+        return _entry(d["name"], d["source"], d.get("tests"), d.get("perf"))
+
+    def __getstate__(self):
+        return {"path": self.path, "offsets": None, "_f": None, "_pid": None}
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        self.offsets = _line_index(self.path)
+
+class DirCorpus(Corpus):
+    """
+    目录下每个 .py 一个条目（第一个顶层函数）；文件列表第一次用到时才扫描。
+    解析不了或没有顶层函数的文件（如空 __init__.py）条目为 None，由 References 跳过。
+    """
+    def __init__(self, root):
+        self.root, self._files = root, None
+
+    @property
+    def files(self):
+        if self._files is None: self._files = list(iter_files([self.root]))
+        return self._files
+
+    def __len__(self):
+        return len(self.files)
+
+    def entry(self, i):
+        path = self.files[i]
+        try:
+            with open(path, encoding="utf-8") as f: text = f.read()
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError, UnicodeDecodeError, OSError):
+            return None
+        fn = next((n for n in tree.body if isinstance(n, ast.FunctionDef)), None)
+        if fn is None: return None
+        side = os.path.splitext(path)[0] + ".json"
+        c = {}
+        if os.path.exists(side):
+            with open(side) as f: c = json.load(f)
+        return _entry(fn.name, ast.get_source_segment(text, fn), c.get("tests"), c.get("perf"))
+
+def load_corpus(src):
+    if isinstance(src, Corpus): return src
+    if isinstance(src, dict): return DictCorpus(src)
+    if os.path.isdir(src): return DirCorpus(src)
+    return JsonlCorpus(src)
+
+# -------- 参考输出 --------
+class References:
+    """
+    下标 → {"name", "source", "tests", "perf", "out"} 的有界 LRU，第一次用到时才 exec 参考实现。
+    给了 pool 就在沙箱里跑（猜出来的输入可能让参考实现死循环）；ref_dir 下按条目 hash 落盘。
+    参考实现在任何输入上都跑不通的条目返回 None。
+    """
+    def __init__(self, corpus, maxsize=1024, ref_dir=None, pool=None):
+        self.corpus, self.maxsize, self.ref_dir, self.pool = corpus, maxsize, ref_dir, pool
+        self.data = OrderedDict()
+
+    def __getitem__(self, i):
+        if i in self.data:
+            self.data.move_to_end(i)
+            return self.data[i]
+        r = self.data[i] = self._load(self.corpus.entry(i))
+        if len(self.data) > self.maxsize: self.data.popitem(last=False)
+        return r
+
+    def _load(self, e):
+        if e is None: return None
+        path = None
+        if self.ref_dir:
+            key = hashlib.blake2b(repr((e["name"], e["source"], e["tests"], e["perf"])).encode(),
+                                  digest_size=8).hexdigest()
+            path = os.path.join(self.ref_dir, f"refs_{key}.pkl")
+            if os.path.exists(path):
+                with open(path, "rb") as f: return pickle.load(f)
+        r = self._run(e)
+        if path:
+            os.makedirs(self.ref_dir, exist_ok=True)
+            with open(path + ".tmp", "wb") as f: pickle.dump(r, f)
+            os.replace(path + ".tmp", path)
+        return r
+
+    def _run(self, e):
+        name, src, tests = e["name"], e["source"], e["tests"]
+        guessed = tests is None
+        if guessed:
+            tests = guess_cases(ast.parse(src).body[0])
+            if not tests: return None
+        if self.pool:
+            res = self.pool.evaluate(name, src, tests, None)
+            if res["status"] != "ok": return None
+            out = res["outputs"]
+        else:
+            ns = {"print": lambda *a, **k: None}; exec(src, ns)
+            out = run_cases(ns[name], tests)
+        if guessed:                                   # 只留参考实现能正常返回的输入
+            tests, out = [c for c, o in zip(tests, out) if o[1] is None], \
+                         [o for o in out if o[1] is None]
+            if not tests: return None
+        perf = e["perf"] or perf_case(tests)
+        return dict(e, tests=tests, perf=perf, out=tuple(out))
@@ -0,0 +1,59 @@
+"""
+cost.py  – 静态字节码成本估计（不执行候选代码）
+编译后逐条指令按 opcode 加权求和；落在 d 层循环里的指令乘 LOOP_N**d（循环由向后跳转识别），
+推导式 / 生成器的 code object 按它被加载处的循环深度计入；sum / max / join 这类在 C 里遍历
+的内置调用，按每元素 C_ITER 的成本算一层循环。只用来比较同一函数的两个版本：估计值之比
+近似加速比，env 据此决定哪些改写值得真的去计时。
+"""
+import dis, types
+
+LOOP_N = 16                     # 每层循环的假定迭代次数
+C_ITER = 1.0                    # C 内置函数每个元素的成本（Python 循环体每条指令 2–10）
+
+# 每条指令的相对成本；没列出的按 DEFAULT
+WEIGHTS = {
+    "NOP": 0, "RESUME": 0, "CACHE": 0, "PRECALL": 0, "EXTENDED_ARG": 0, "KW_NAMES": 0,
+    "LOAD_FAST": 1, "STORE_FAST": 1, "LOAD_CONST": 1, "POP_TOP": 1, "COPY": 1, "SWAP": 1,
+    "LOAD_DEREF": 2, "STORE_DEREF": 2, "LOAD_GLOBAL": 4, "LOAD_NAME": 4, "STORE_NAME": 4,
+    "LOAD_ATTR": 5, "LOAD_METHOD": 5, "STORE_ATTR": 6, "BINARY_SUBSCR": 4, "STORE_SUBSCR": 5,
+    "BINARY_OP": 3, "COMPARE_OP": 3, "CONTAINS_OP": 3, "IS_OP": 1, "UNARY_NOT": 1,
+    "FOR_ITER": 3, "GET_ITER": 2, "LIST_APPEND": 2, "SET_ADD": 3, "MAP_ADD": 3,
+    "YIELD_VALUE": 4, "RETURN_VALUE": 1, "MAKE_FUNCTION": 8,
+    "CALL": 12, "CALL_FUNCTION": 12, "CALL_METHOD": 10, "CALL_FUNCTION_KW": 14,
+    "CALL_FUNCTION_EX": 16, "BUILD_LIST": 5, "BUILD_TUPLE": 3, "BUILD_SET": 8, "BUILD_MAP": 8,
+}
+DEFAULT = 2
+
+# 在 C 里遍历参数的内置函数 / 方法：调用本身之外再加一层 C_ITER 的循环
+C_LOOPS = {"sum", "max", "min", "any", "all", "sorted", "list", "tuple", "set", "dict",
+           "frozenset", "map", "filter", "zip", "enumerate", "reversed",
+           "join", "extend", "update", "count", "index"}
+
+def _loops(ins):
+    # 向后跳转 = 一个循环：[跳转目标, 最后一个跳回该目标的指令]；continue / 推导式里的 if
+    # 也会向后跳到同一个目标，按目标合并
+    ends = {}
+    for i in ins:
+        if (i.opcode in dis.hasjrel + dis.hasjabs and isinstance(i.argval, int)
+            and i.argval <= i.offset):
+            ends[i.argval] = max(ends.get(i.argval, 0), i.offset)
+    return list(ends.items())
+
+def code_cost(code: types.CodeType) -> float:
+    ins = list(dis.get_instructions(code))
+    loops = _loops(ins)
+    total = 0.0
+    for i in ins:
+        mult = LOOP_N ** sum(a <= i.offset <= b for a, b in loops)
+        total += WEIGHTS.get(i.opname, DEFAULT) * mult
+        if isinstance(i.argval, types.CodeType):                 # 推导式 / 生成器 / 内层函数
+            total += code_cost(i.argval) * mult
+        elif i.opname in ("LOAD_GLOBAL", "LOAD_NAME", "LOAD_METHOD", "LOAD_ATTR") \
+                and i.argval in C_LOOPS:
+            total += C_ITER * LOOP_N * mult
+    return total
+
+def static_cost(code: types.CodeType) -> float:
+    """CodeState.code（定义函数的模块 code）→ 函数体的估计成本；模块本身定义函数的开销不计。"""
+    inner = [c for c in code.co_consts if isinstance(c, types.CodeType)]
+    return code_cost(inner[0]) if inner else code_cost(code)
@@ -1,93 +1,236 @@
 """
 env.py  – mix heuristic & learned reward; uses CodeTransformationAgent.
 """
-import ast, time, random, numpy as np
-from agent import CodeTransformationAgent
-from reward_model import PairwiseRewardModel
+import marshal, math, random, numpy as np
+from types import SimpleNamespace
+from agent import CodeTransformationAgent, CodeState
+from reward_model import PairwiseRewardModel, _feat
+from cache import EvalCache, code_hash
+from timing import measure, compare
+from sandbox import EvalPool, check_cases
+from profiler import PROFILE
+from experience import ExperienceWriter
+from corpus import load_corpus, References
+from scaling import SIZES, ladder, measure_ladder, scaling_terms
+from memory import measure_memory, memory_ratio
+from cost import static_cost
+
+def observe(state):
+    return np.array([len(state)/100], dtype=np.float32)
 
 class CodeOptimizeEnv:
-    def __init__(self, funcs, cfg):
-        self.funcs = funcs
+    def __init__(self, funcs, cfg, shard=None):
+        # funcs：dict / Corpus / JSONL 路径 / 目录（见 corpus.py）；shard=(k, n) 只用第 k 片
+        self.corpus = load_corpus(funcs)
+        if shard: self.corpus = self.corpus.shard(*shard)
         self.cfg = cfg
         self.ct = CodeTransformationAgent()
-        self.rm = PairwiseRewardModel()
+        self.rm = PairwiseRewardModel(background=cfg.get("rm_background", False))
         self.max_steps = cfg.get("max_steps", 10)
-        self._prepare_refs()
-
-    # -------- dataset --------
-    def _prepare_refs(self):
-        self.ref_funcs, self.tests, self.perfs = {}, {}, {}
-        for n, code in self.funcs.items():
-            ns={}; exec(code, ns)
-            self.ref_funcs[n]=ns[n]
-            if n in ("sum_list","double_list"):
-                self.tests[n]=[([1,2,3],), ([],)]
-                self.perfs[n]=[([i for i in range(5000)],)]
-            elif n=="max_list":
-                self.tests[n]=[([3,1,2],), ([42],)]
-                self.perfs[n]=[([i for i in range(5000)],)]
-            elif n=="check_positive":
-                self.tests[n]=[(5,), (-1,)]
-                self.perfs[n]=[(9999999,)]
-            else:
-                self.tests[n]=[("Bob",)]
-                self.perfs[n]=[("Bob"*4,)]
+        self.cache = EvalCache(cfg.get("cache_size", 1024))
+        self.timing = dict(repeat=cfg.get("timing_repeat", 5),
+                           budget=cfg.get("time_budget", 0.02))
+        # 规模阶梯计时：奖励复杂度指数下降和最大规模上的加速（见 scaling.py）
+        self.scaling = (dict(repeat=cfg.get("timing_repeat", 5),
+                             budget=cfg.get("scaling_budget", 0.005))
+                        if cfg.get("scaling") else None)
+        # tracemalloc 量峰值内存 / 留存块数：奖励 w_mem·log2(旧峰值 / 新峰值)，内存涨了就是惩罚
+        self.memory = cfg.get("memory", False)
+        # 静态字节码成本（cost.py）是默认的快速奖励：估计的加速比偏离 1 超过 cost_threshold（对数）
+        # 或按 timing_frac 抽中时才真的计时（连同规模阶梯）；cost_model=False 时每步都计时
+        self.cost_model = cfg.get("cost_model", True)
+        self.pool = (EvalPool(cfg.get("sandbox_workers", 1), cfg.get("sandbox_timeout", 2.0),
+                              cfg.get("sandbox_mem", 256 << 20), cfg.get("sandbox_cpu", 2))
+                     if cfg.get("sandbox") else None)
+        # 观测维度由 observe() 决定（gym 风格的 .shape），经验库的记录宽度跟着它走
+        self.observation_space = SimpleNamespace(shape=observe("").shape)
+        # 每个 transition 落到磁盘经验库（每个进程一个写端子目录）
+        self.exp = (ExperienceWriter(cfg["experience"], self.observation_space.shape[0])
+                    if cfg.get("experience") else None)
+        if cfg.get("profile"): PROFILE.enabled = True   # 进程内全局：agent / rm 一起计时
+        self.refs = References(self.corpus, cfg.get("ref_cache", 1024), cfg.get("ref_dir"), self.pool)
 
     # -------- RL interface --------
-    def reset(self):
-        self.name = random.choice(list(self.funcs))
-        self.code = self.funcs[self.name]
+    def reset(self, i=None):
+        """i 为语料（分片）内下标，缺省随机抽；参考实现跑不通的条目跳过重抽。"""
+        for _ in range(100):
+            k = random.randrange(len(self.corpus)) if i is None else i
+            self.ref = self.refs[k]
+            if self.ref is not None: break
+            if i is not None: raise ValueError(f"corpus entry {i} has no usable test inputs")
+        else:
+            raise RuntimeError("no usable function found in 100 draws")
+        self.name, self.key = self.ref["name"], f"{k}/{self.ref['name']}"
+        if self.scaling and "ladder" not in self.ref:
+            self.ref["ladder"] = ladder(self.ref["perf"], self.cfg.get("scaling_sizes", SIZES))
+        self.state = CodeState(self.ref["source"])
         self.steps = 0
         return self._obs()
 
+    @property
+    def code(self):
+        return self.state.src
+
     def _obs(self):
-        return np.array([len(self.code)/100], dtype=np.float32)
+        return observe(self.state)
+
+    def action_mask(self):
+        return np.array(self.ct.mask(self.state), dtype=bool)
 
     def step(self, action):
+        prev = self.state
+        with PROFILE.stage("step"):
+            obs, r, done, info = self._step(action)
+        if self.exp: self._record(prev, action, r, done, info)
+        if done and PROFILE.enabled:
+            info["prof"] = PROFILE.take()         # 每个 episode 一份 {stage: [seconds, calls]}
+        return obs, r, done, info
+
+    def _step(self, action):
         self.steps += 1
-        new_code, changed = self.ct.propose(self.code, action)
+        with PROFILE.stage("apply"):
+            new, changed = self.ct.apply(self.state, action)
 
         if not changed:
-            done = self.steps >= self.max_steps
-            return self._obs(), -1.0, done, {"heu": 0.0, "lr": 0.0}
+            mask = self.action_mask()
+            done = self.steps >= self.max_steps or not mask.any()
+            return self._obs(), -1.0, done, {"heu": 0.0, "lr": 0.0, "mask": mask}
+
+        est = self._cost(self.state) / self._cost(new)      # >1：估计变快
+        timed = (not self.cost_model or abs(math.log(est)) > self.cfg.get("cost_threshold", 0.1)
+                 or random.random() < self.cfg.get("timing_frac", 0.1))
 
         # correctness
-        if not self._correct(new_code):
+        if not self._correct(new, timed):
             return self._obs(), -10.0, True, {}
 
         # heuristic reward
-        heu = 0.0
-        if changed:
-            l_prev, l_new = len(self.code), len(new_code)
-            t_prev, t_new = self._rt(self.code), self._rt(new_code)
-            heu = (l_prev - l_new) + 20 * ((t_prev/t_new) - 1)
+        l_prev, l_new = len(self.state), len(new)
+        if timed:
+            # 沙箱里计时可能超时 / 崩溃（结果为 None）：这一步没有速度项
+            t_prev, t_new = self._rt(self.state), self._rt(new)
+            speedup, sig = (compare(t_prev, t_new, self.cfg.get("timing_alpha", 0.05))
+                            if t_prev is not None and t_new is not None else (1.0, False))
+        else:
+            speedup, sig = est, True                         # 估计没有噪声，但变化都在阈值以内
+        heu = (l_prev - l_new) + (20 * (speedup - 1) if sig else 0.0)  # 不显著的加速视为噪声
+        extra = {"timed": timed, "est_speedup": est}
+        if self.scaling and timed:
+            d_exp, big, sig_big = scaling_terms(self._scaling(self.state), self._scaling(new),
+                                                self.cfg.get("timing_alpha", 0.05))
+            if abs(d_exp) < self.cfg.get("exp_tol", 0.1): d_exp = 0.0      # 拟合噪声
+            heu += self.cfg.get("w_exp", 10.0) * d_exp
+            heu += self.cfg.get("w_large", 20.0) * (big - 1) if sig_big else 0.0
+            extra.update(d_exp=d_exp, large_speedup=big)
+        if self.memory:
+            m_prev, m_new = self._memory(self.state), self._memory(new)
+            ratio = memory_ratio(m_prev, m_new, self.cfg.get("mem_floor", 1024))
+            heu += self.cfg.get("w_mem", 20.0) * math.log2(ratio)
+            extra.update(mem_ratio=ratio, peak_mem=getattr(m_new, "peak", None),
+                         allocs=getattr(m_new, "blocks", None))
 
         # learned reward
-        lr = self.rm.score(self.code, new_code)
-        self.rm.add(self.code, new_code, heu > 0)
-        self.code = new_code
+        lr = self.rm.score(self.state, new)
+        self.rm.add(self.state, new, heu > 0)
+        self.state = new
 
         mixed = self.cfg["alpha"]*heu + self.cfg["beta"]*lr
-        done = self.steps >= self.max_steps
-        return self._obs(), mixed, done, {"heu": heu, "lr": lr}
+        mask = self.action_mask()
+        done = self.steps >= self.max_steps or not mask.any()   # 没有可用动作就提前结束
+        return self._obs(), mixed, done, {"heu": heu, "lr": lr, "speedup": speedup, "mask": mask,
+                                          **extra}
+
+    def _record(self, prev, action, r, done, info):
+        st = self.state
+        pair = "speedup" in info                  # 改写且通过验证：同时是 reward model 样本
+        self.exp.add(observe(prev), action, r, done, code_hash(st.src),
+                     _feat(st) - _feat(prev) if pair else None, int(info.get("heu", 0) > 0),
+                     st.src if pair else None)
 
     # -------- helpers --------
-    def _compile(self, code):
-        ns={"print":lambda *a,**k:None}; exec(code, ns); return ns[self.name]
-
-    def _rt(self, code):
-        fn = self._compile(code)
-        args = self.perfs[self.name][0]
-        s=time.perf_counter(); fn(*args); return time.perf_counter()-s
-
-    def _correct(self, code):
-        ref = self.ref_funcs[self.name]; new = self._compile(code)
-        for case in self.tests[self.name]:
-            try: r_ref, e_ref = ref(*case), None
-            except Exception as e: e_ref = type(e)
-            try: r_new, e_new = new(*case), None
-            except Exception as e: e_new = type(e)
-            if e_ref or e_new:
-                if e_ref != e_new: return False
-            elif r_ref != r_new: return False
-        return True
+    # st 均为 CodeState：缓存按源码取，exec 直接用 AST 编译出的 code object
+    def _compile(self, st):
+        e = self.cache.entry(self.key, st.src)
+        if "fn" not in e:
+            code = st.code
+            with PROFILE.stage("exec"):
+                ns={"print":lambda *a,**k:None}; exec(code, ns); e["fn"] = ns[self.name]
+        return e["fn"]
+
+    def _rt(self, st):
+        e = self.cache.entry(self.key, st.src)
+        if "rt" not in e:
+            if self.pool: self._sandboxed(st, e)
+            else:
+                fn = self._compile(st)
+                with PROFILE.stage("timing"):
+                    e["rt"] = measure(fn, self.ref["perf"], **self.timing)
+        return e.get("rt")
+
+    def _scaling(self, st):
+        e = self.cache.entry(self.key, st.src)
+        if "sc" not in e:
+            if self.pool: self._sandboxed(st, e)
+            else:
+                fn = self._compile(st)
+                with PROFILE.stage("scaling"):
+                    e["sc"] = measure_ladder(fn, self.ref["ladder"], **self.scaling)
+        return e.get("sc")
+
+    def _memory(self, st):
+        e = self.cache.entry(self.key, st.src)
+        if "mem" not in e:
+            if self.pool: self._sandboxed(st, e)
+            else:
+                fn = self._compile(st)
+                with PROFILE.stage("memory"):
+                    try: e["mem"] = measure_memory(fn, self.ref["perf"])
+                    except Exception: e["mem"] = None
+        return e.get("mem")
+
+    def _cost(self, st):
+        e = self.cache.entry(self.key, st.src)
+        if "cost" not in e:
+            code = st.code
+            with PROFILE.stage("cost"): e["cost"] = static_cost(code)
+        return e["cost"]
+
+    def _correct(self, st, timed=True):
+        # 沙箱里正确性和计时走同一次 IPC；不计时的步只验证
+        e = self.cache.entry(self.key, st.src)
+        if "ok" not in e:
+            e["ok"] = self._sandboxed(st, e, timed) if self.pool else self._check(st)
+        return e["ok"]
+
+    def _check(self, st):
+        fn = self._compile(st)
+        with PROFILE.stage("correct"):
+            return check_cases(fn, self.ref["tests"], self.ref["out"])
+
+    def _sandboxed(self, st, e, timed=True):
+        # 一次 IPC 同时拿到正确性和计时；超时 / 崩溃 / 爆内存都算不正确
+        code = marshal.dumps(st.code)
+        with PROFILE.stage("sandbox"):        # 正确性 + 计时在子进程里，这里只能看到总时间
+            res = self.pool.evaluate(self.name, code, self.ref["tests"],
+                                     self.ref["out"], self.ref["perf"], self.timing,
+                                     (self.ref["ladder"], self.scaling) if self.scaling else None,
+                                     self.memory, timed)
+        e["ok"] = res["status"] == "ok" and res["correct"]
+        if res["status"] == "ok":               # 超时 / 崩溃时不缓存测量结果：下次要用时重新跑
+            if timed: e["rt"] = res.get("timing")
+            if self.scaling and timed: e["sc"] = res.get("scaling")
+            if self.memory: e["mem"] = res.get("memory")
+        return e["ok"]
+
+    # -------- checkpoint --------
+    # 只存跨 episode 的状态；进行中的 episode 不存，恢复后调用方重新 reset()
+    def state_dict(self):
+        return {"rm": self.rm, "random": random.getstate(), "np_random": np.random.get_state()}
+
+    def load_state_dict(self, d):
+        self.rm = d["rm"]
+        random.setstate(d["random"]); np.random.set_state(d["np_random"])
+
+    def close(self):
+        if self.pool: self.pool.close()
+        if self.exp: self.exp.close()
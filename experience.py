@@ -0,0 +1,136 @@
+"""
+experience.py  – 磁盘上的经验库（numpy memmap 分片）
+
+    root/
+      w<pid>/shard_00000.npy ...   定长记录，每个写端（进程）一个子目录，互不加锁
+      w<pid>/meta.json             {"n": 已提交的行数}；读端只看这之前的行
+      w<pid>/sources.bin / .idx    code-hash → 源码 的旁表（只追加，按 hash 去重）
+
+每条记录是一个 transition：(obs, action, reward, done, hash, feat, label, pair)。
+hash 是 step 之后状态的 cache.code_hash；pair=True 的行同时是 reward model 的样本
+（feat = _feat(new) - _feat(prev)，label = 启发式是否变好）。
+
+读端 ExperienceReader 把所有写端的分片拼成一个全局下标空间：
+连续区间 view() 直接返回 memmap 切片（零拷贝）；sample() 随机取下标，
+按分片 gather，只有被抽中的页会读进内存，数据集可以远大于内存。
+"""
+import glob, json, os, numpy as np
+from reward_model import N_FEAT
+
+def record_dtype(obs_dim):
+    return np.dtype([("obs", "<f4", (obs_dim,)), ("action", "<i4"), ("reward", "<f4"),
+                     ("done", "?"), ("hash", "S16"), ("feat", "<f4", (N_FEAT,)),
+                     ("label", "i1"), ("pair", "?")])
+
+def _write_json(path, obj):
+    with open(path + ".tmp", "w") as f: json.dump(obj, f)
+    os.replace(path + ".tmp", path)
+
+class ExperienceWriter:
+    """单进程写端；每 flush_every 行提交一次 meta（读端可见），close() 时再提交一次。"""
+    def __init__(self, root, obs_dim, shard_size=1 << 16, flush_every=256):
+        self.dir = os.path.join(root, f"w{os.getpid()}")
+        os.makedirs(self.dir, exist_ok=True)
+        self.dtype, self.shard_size, self.flush_every = record_dtype(obs_dim), shard_size, flush_every
+        meta = os.path.join(self.dir, "meta.json")
+        self.n = json.load(open(meta))["n"] if os.path.exists(meta) else 0
+        self.shard = self.shard_id = None
+        self.src_f = open(os.path.join(self.dir, "sources.bin"), "ab")
+        self.idx_f = open(os.path.join(self.dir, "sources.idx"), "ab")
+        self.seen = set()
+        _write_json(os.path.join(self.dir, "meta.json"),
+                    {"n": self.n, "shard_size": shard_size, "dtype": str(self.dtype.descr)})
+
+    def _row(self):
+        sid, i = divmod(self.n, self.shard_size)
+        if sid != self.shard_id:
+            if self.shard is not None: self.shard.flush()
+            path = os.path.join(self.dir, f"shard_{sid:05d}.npy")
+            self.shard = (np.load(path, mmap_mode="r+") if os.path.exists(path) else
+                          np.lib.format.open_memmap(path, "w+", self.dtype, (self.shard_size,)))
+            self.shard_id = sid
+        return self.shard[i:i + 1]
+
+    def add(self, obs, action, reward, done, code_hash, feat=None, label=0, src=None):
+        """code_hash 为 cache.code_hash 的十六进制串；给了 src 则同时记入旁表。"""
+        h = bytes.fromhex(code_hash)
+        self._row()[0] = (obs, action, reward, done, h,
+                          np.zeros(N_FEAT) if feat is None else feat, label, feat is not None)
+        if src is not None and h not in self.seen:
+            self.seen.add(h)
+            b = src.encode()
+            self.idx_f.write(h + np.array([self.src_f.tell(), len(b)], "<i8").tobytes())
+            self.src_f.write(b)
+        self.n += 1
+        if self.n % self.flush_every == 0: self.flush()
+
+    def flush(self):
+        if self.shard is not None: self.shard.flush()
+        self.src_f.flush(); self.idx_f.flush()           # 旁表先于 meta 落盘
+        _write_json(os.path.join(self.dir, "meta.json"),
+                    {"n": self.n, "shard_size": self.shard_size, "dtype": str(self.dtype.descr)})
+
+    def close(self):
+        if self.src_f.closed: return
+        self.flush()
+        self.src_f.close(); self.idx_f.close()
+
+class ExperienceReader:
+    """root 下所有写端的只读视图；打开时快照各写端已提交的行数。"""
+    def __init__(self, root):
+        self.shards, starts = [], [0]                     # 每个分片：(memmap, 有效行数)
+        self.dirs = sorted(d for d in glob.glob(os.path.join(root, "w*")) if os.path.isdir(d))
+        for d in self.dirs:
+            with open(os.path.join(d, "meta.json")) as f: meta = json.load(f)
+            n, size = meta["n"], meta["shard_size"]
+            for sid in range((n + size - 1) // size):
+                arr = np.load(os.path.join(d, f"shard_{sid:05d}.npy"), mmap_mode="r")
+                k = min(size, n - sid * size)
+                self.shards.append((arr, k)); starts.append(starts[-1] + k)
+        self.starts = np.array(starts, dtype=np.int64)
+        self._sources = None
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def view(self, shard, lo=0, hi=None):
+        """第 shard 个分片的 [lo, hi) 行，零拷贝 memmap 切片。"""
+        arr, k = self.shards[shard]
+        return arr[lo:k if hi is None else min(hi, k)]
+
+    def gather(self, idx):
+        """按全局下标取记录（结构化数组）；同一分片的下标一次 fancy-index。"""
+        idx = np.asarray(idx, dtype=np.int64)
+        out = np.empty(len(idx), dtype=self.shards[0][0].dtype if self.shards else None)
+        sid = np.searchsorted(self.starts, idx, side="right") - 1
+        for s in np.unique(sid):
+            sel = sid == s
+            out[sel] = self.shards[s][0][idx[sel] - self.starts[s]]
+        return out
+
+    def sample(self, batch_size, rng=None):
+        rng = rng or np.random.default_rng()
+        return self.gather(rng.integers(0, len(self), batch_size))
+
+    def pairs(self, batch_size, n_batches, rng=None):
+        """reward model 的 (X, y) 小批：随机抽行后只留 pair 行，批大小因此会浮动。"""
+        rng = rng or np.random.default_rng()
+        for _ in range(n_batches):
+            r = self.sample(batch_size, rng)
+            r = r[r["pair"]]
+            if len(r): yield r["feat"], r["label"]
+
+    def source(self, code_hash):
+        """hash（十六进制串或 16 字节）→ 源码；第一次调用时读入各写端的索引。"""
+        if self._sources is None:
+            self._sources = {}
+            rec = np.dtype([("hash", "S16"), ("off", "<i8"), ("len", "<i8")])
+            for d in self.dirs:
+                path = os.path.join(d, "sources.idx")
+                n = os.path.getsize(path) // rec.itemsize
+                for h, off, ln in np.fromfile(path, rec, count=n):
+                    self._sources[h] = (d, int(off), int(ln))
+        h = bytes.fromhex(code_hash) if isinstance(code_hash, str) else code_hash
+        d, off, ln = self._sources[h.rstrip(b"\0")]       # numpy 的 S16 读出来会去掉末尾的 \0
+        with open(os.path.join(d, "sources.bin"), "rb") as f:
+            f.seek(off); return f.read(ln).decode()
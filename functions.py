@@ -35,5 +35,50 @@ def double_list(lst):
     for x in lst:
         res.append(x * 2)
     return res
+""",
+"strip_vowels": """
+def strip_vowels(text):
+    out = ""
+    for ch in text:
+        if ch not in ["a", "e", "i", "o", "u"]:
+            out += ch
+    return out
+""",
+"has_negative": """
+def has_negative(lst):
+    for x in lst:
+        if x < 0:
+            return True
+    return False
+""",
+"normalize": """
+def normalize(lst):
+    res = []
+    for i in range(len(lst)):
+        scale = len(lst) * 2 + 1
+        res.append(lst[i] / scale)
+    return res
+""",
+"pairs": """
+def pairs(a, b):
+    res = []
+    for x in a:
+        for y in b:
+            if x < y:
+                res.append((x, y))
+    return res
 """
 }
+
+# 每个函数的测试输入和计时输入（参数元组）；没列出的函数由 corpus.guess_cases 猜
+cases = {
+    "sum_list":       {"tests": [([1, 2, 3],), ([],)],  "perf": (list(range(5000)),)},
+    "double_list":    {"tests": [([1, 2, 3],), ([],)],  "perf": (list(range(5000)),)},
+    "max_list":       {"tests": [([3, 1, 2],), ([42],)], "perf": (list(range(5000)),)},
+    "check_positive": {"tests": [(5,), (-1,)],          "perf": (9999999,)},
+    "greet":          {"tests": [("Bob",)],             "perf": ("Bob" * 4,)},
+    "strip_vowels":   {"tests": [("education",), ("",)], "perf": ("education" * 500,)},
+    "has_negative":   {"tests": [([1, -2],), ([],)],    "perf": (list(range(5000)),)},
+    "normalize":      {"tests": [([1, 2, 3],), ([],)],  "perf": (list(range(300)),)},
+    "pairs":          {"tests": [([1, 2], [2, 3]), ([], [1])], "perf": (list(range(60)), list(range(60)))},
+}
@@ -0,0 +1,41 @@
+"""
+memory.py  – 单次调用的内存开销
+tracemalloc 下跑一次 fn(*args)：调用期间相对调用前的峰值增量，以及调用结束时新增且仍存活的
+内存块数（含返回值）。tracemalloc 会让代码慢好几倍，所以和计时分开、只跑一次。
+tracemalloc 只看得到真正向分配器要的内存：从 freelist 复用的小 tuple / float 等不计入块数。
+"""
+import gc, tracemalloc
+
+class Memory:
+    __slots__ = ("peak", "blocks")
+
+    def __init__(self, peak, blocks):
+        self.peak = peak                        # 字节
+        self.blocks = blocks                    # 留存的分配块数；外层已在追踪时为 None
+
+    def __repr__(self):
+        return f"Memory(peak={self.peak}B, blocks={self.blocks})"
+
+def measure_memory(fn, args=(), warmup=1):
+    """warmup 次不追踪的调用（填好各种缓存）之后，在 tracemalloc 下再调用一次。"""
+    for _ in range(warmup): fn(*args)
+    gc_on = gc.isenabled(); gc.disable()        # 回收时机不同会让峰值抖动
+    own = not tracemalloc.is_tracing()          # 外层已在追踪就不重启，也不数块
+    if own: tracemalloc.start()
+    try:
+        n0 = len(tracemalloc.take_snapshot().traces) if own else None
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        out = fn(*args)
+        peak = tracemalloc.get_traced_memory()[1] - base
+        blocks = len(tracemalloc.take_snapshot().traces) - n0 if own else None
+        del out
+    finally:
+        if own: tracemalloc.stop()
+        if gc_on: gc.enable()
+    return Memory(max(peak, 0), blocks)
+
+def memory_ratio(prev, new, floor=1024):
+    """prev / new 的峰值之比（>1 表示省内存）；都按 floor 字节兜底，避免几十字节的抖动被放大。"""
+    if prev is None or new is None: return 1.0
+    return max(prev.peak, floor) / max(new.peak, floor)
@@ -0,0 +1,121 @@
+"""
+metrics.py  – 逐 episode 的流式指标日志（列式定长二进制，只追加）
+
+    w = MetricsWriter("metrics.bin"); w.write(ret=..., heu=..., lr=..., steps=..., name="sum_list")
+    m = MetricsLog("metrics.bin");    m.moving_average("ret", 200)
+
+每条记录是一个 numpy 结构化 dtype 的定长行，读端直接 np.memmap，不用整体读进内存；
+函数名存成 name_id，映射表在旁边的 <path>.json 里。崩溃时最多丢掉缓冲里没刷的几行，
+末尾不完整的半行读端会忽略。
+
+    python metrics.py metrics.bin --window 200      # 打印汇总和最近的滑动平均
+"""
+import argparse, json, os, time, numpy as np
+
+DTYPE = np.dtype([("episode", "<i8"), ("ret", "<f4"), ("heu", "<f4"), ("lr", "<f4"),
+                  ("steps", "<i4"), ("name_id", "<i4"), ("time", "<f8")])
+
+def _sidecar(path):
+    return path + ".json"
+
+class MetricsWriter:
+    """缓冲 flush_every 行写一次；truncate_to 用于续训时丢掉 checkpoint 之后的行。"""
+    def __init__(self, path, flush_every=64, truncate_to=None):
+        self.path, self.flush_every = path, flush_every
+        self.names, self.name_ids = [], {}
+        if os.path.exists(_sidecar(path)):
+            with open(_sidecar(path)) as f: self.names = json.load(f)["names"]
+            self.name_ids = {n: i for i, n in enumerate(self.names)}
+        self.f = open(path, "ab")
+        n = self.f.tell() // DTYPE.itemsize
+        if truncate_to is not None: n = min(n, truncate_to)
+        self.f.truncate(n * DTYPE.itemsize); self.f.seek(0, os.SEEK_END)
+        self.n = n                                     # 已写（含缓冲中）的行数
+        self.buf = np.zeros(flush_every, dtype=DTYPE)
+        self.k = 0
+        self._names_dirty = False
+
+    def __len__(self):
+        return self.n
+
+    def write(self, ret, heu=0.0, lr=0.0, steps=0, name=""):
+        i = self.name_ids.get(name)
+        if i is None:
+            i = self.name_ids[name] = len(self.names)
+            self.names.append(name); self._names_dirty = True
+        self.buf[self.k] = (self.n, ret, heu, lr, steps, i, time.time())
+        self.k += 1; self.n += 1
+        if self.k == self.flush_every: self.flush()
+
+    def flush(self):
+        if self._names_dirty:                          # 先落名字表，读端不会遇到未知 id
+            with open(_sidecar(self.path) + ".tmp", "w") as f:
+                json.dump({"dtype": DTYPE.descr, "names": self.names}, f)
+            os.replace(_sidecar(self.path) + ".tmp", _sidecar(self.path))
+            self._names_dirty = False
+        if self.k:
+            self.f.write(self.buf[:self.k].tobytes()); self.k = 0
+        self.f.flush()
+
+    def close(self):
+        if not self.f.closed:
+            self.flush(); self.f.close()
+
+class MetricsLog:
+    """只读视图：列是 memmap 上的切片，按块计算，内存占用与总行数无关（输出数组除外）。"""
+    def __init__(self, path):
+        n = os.path.getsize(path) // DTYPE.itemsize
+        self.rec = (np.memmap(path, dtype=DTYPE, mode="r", shape=(n,)) if n
+                    else np.zeros(0, dtype=DTYPE))
+        self.names = []
+        if os.path.exists(_sidecar(path)):
+            with open(_sidecar(path)) as f: self.names = json.load(f)["names"]
+
+    def __len__(self):
+        return len(self.rec)
+
+    def column(self, col):
+        return self.rec[col]
+
+    def moving_average(self, col="ret", window=50, chunk=1 << 20):
+        """尾随窗口均值（开头不足 window 的按已有的算），float32，和列等长。"""
+        x, n = self.column(col), len(self)
+        out = np.empty(n, dtype=np.float32)
+        tail = np.zeros(0)
+        for s in range(0, n, chunk):
+            c = np.concatenate([tail, np.asarray(x[s:s + chunk], dtype=np.float64)])
+            cs = np.concatenate([[0.0], np.cumsum(c)])
+            idx = np.arange(len(tail), len(c))
+            lo = np.maximum(idx - window + 1, 0)
+            out[s:s + len(idx)] = (cs[idx + 1] - cs[lo]) / (idx + 1 - lo)
+            tail = c[len(c) - window + 1:] if window > 1 else c[:0]
+        return out
+
+    def per_function(self, col="ret", chunk=1 << 20):
+        """{函数名: (episode 数, 均值)}。"""
+        k = max(len(self.names), 1)
+        cnt, tot = np.zeros(k), np.zeros(k)
+        for s in range(0, len(self), chunk):
+            r = self.rec[s:s + chunk]
+            cnt += np.bincount(r["name_id"], minlength=k)[:k]
+            tot += np.bincount(r["name_id"], weights=r[col], minlength=k)[:k]
+        return {n: (int(cnt[i]), tot[i] / cnt[i]) for i, n in enumerate(self.names) if cnt[i]}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="summarize a metrics.bin log")
+    ap.add_argument("path", nargs="?", default="metrics.bin")
+    ap.add_argument("--window", type=int, default=50)
+    ap.add_argument("--last", type=int, default=10, help="打印最后几个滑动平均点")
+    args = ap.parse_args(argv)
+    m = MetricsLog(args.path)
+    print(f"{len(m)} episodes")
+    if not len(m): return
+    ma = m.moving_average("ret", args.window)
+    step = max(len(m) // args.last, 1)
+    for i in range(len(m) - 1, -1, -step)[:args.last][::-1]:
+        print(f"  ep {i+1:>9}  avg_R({args.window})={ma[i]:.2f}")
+    for name, (n, mean) in sorted(m.per_function().items()):
+        print(f"  {name:<30} n={n:<9} mean_R={mean:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+optimize.py  – 用训练好的 PolicyNet + CodeTransformationAgent 优化整个文件 / 目录
+
+    python optimize.py src/ --policy policy_final.pt            # 打印 unified diff
+    python optimize.py a.py b.py --write --workers 8            # 原地改写
+
+逐个流出模块顶层的 FunctionDef，在进程池里跑策略；每一步改写都在 EvalPool 沙箱里
+和原函数在自动生成的输入上做差分验证，最后对比原函数计时，报告每个函数的加速比。
+只引用模块 import 和自身参数的函数才能验证；其余的报告为 unverified、不改写。
+"""
+import argparse, ast, difflib, os, sys, numpy as np, torch
+from concurrent.futures import ProcessPoolExecutor
+from agent import CodeTransformationAgent, CodeState
+from corpus import iter_files, guess_cases, perf_case
+from transformation import ACTIONS, rename_one_variable
+from env import observe
+from policy import load_policy
+from sandbox import EvalPool
+from timing import compare
+
+# -------- 源码切分 --------
+def iter_functions(paths):
+    """流式产出 (path, name, lineno, end_lineno, src, prelude)；prelude 为模块级 import。"""
+    for path in iter_files(paths):
+        try:
+            with open(path, encoding="utf-8") as f: text = f.read()
+            tree = ast.parse(text)
+        except (SyntaxError, UnicodeDecodeError, OSError) as e:
+            print(f"skip {path}: {e}", file=sys.stderr); continue
+        prelude = "\n".join(ast.get_source_segment(text, n) for n in tree.body
+                            if isinstance(n, (ast.Import, ast.ImportFrom)))
+        for n in tree.body:
+            if isinstance(n, ast.FunctionDef):
+                yield (path, n.name, n.lineno, n.end_lineno,
+                       ast.get_source_segment(text, n), prelude)
+
+def reference_cases(name, source, fn, pool):
+    """在沙箱里跑原函数，返回它不抛异常的 (cases, expected)；一个都没有则返回 None。"""
+    cases = guess_cases(fn)
+    res = pool.evaluate(name, source, cases, None) if cases else {"status": "none"}
+    if res["status"] != "ok":
+        return None
+    valid = [(c, o) for c, o in zip(cases, res["outputs"]) if o[1] is None]
+    if not valid:
+        return None
+    return [c for c, _ in valid], [o for _, o in valid]
+
+# -------- 单函数优化 --------
+def policy_fn(net):
+    """PolicyNet → 单条 obs 的动作概率函数（server 里换成微批版本）。"""
+    def probs(obs):
+        with torch.no_grad():
+            return net(torch.as_tensor(obs).float().unsqueeze(0))[0].numpy()
+    return probs
+
+def pick(policy, agent, state, banned):
+    """
+    policy(obs) → 动作概率；在可用且未被否决的动作里取概率最大的，
+    policy 为 None 时按动作编号顺序取。
+    """
+    mask = np.array(agent.mask(state), dtype=bool)
+    mask[list(banned)] = False
+    if not mask.any(): return None
+    if policy is None: return int(np.argmax(mask))
+    probs = policy(observe(state))
+    p = np.zeros(len(mask)); k = min(len(p), len(probs)); p[:k] = probs[:k]
+    p = np.where(mask, p + 1e-12, -1.0)           # 策略没见过的新动作排在最后
+    return int(np.argmax(p))
+
+def optimize_function(name, src, prelude, policy, agent, pool, steps=10, timing=None, skip=()):
+    """
+    跑一条贪心轨迹，每步在沙箱里验证；验证失败的动作在该状态下被否决换下一个，
+    skip 里的动作始终不用。返回 {"status", "src", "steps", "speedup", "significant", "t_old", "t_new"}；
+    只改了格式（和原函数 unparse 后相同）时报告 unchanged，原文件不动。
+    """
+    timing = timing or dict(repeat=5, budget=0.05)
+    head = prelude + "\n" if prelude else ""
+    state = CodeState(src)
+    out = {"status": "unchanged", "src": src, "steps": 0, "speedup": 1.0}
+    ref = reference_cases(name, head + src, state.fn, pool)
+    if ref is None:
+        return dict(out, status="unverified")
+    cases, expected = ref
+
+    banned = set(skip)
+    for _ in range(steps):
+        a = pick(policy, agent, state, banned)
+        if a is None: break
+        new, changed = agent.apply(state, a)
+        changed = changed and new.src != state.src      # 源码没变的改写不算一步
+        r = pool.evaluate(name, head + new.src, cases, expected) if changed else None
+        if r is None or r["status"] != "ok" or not r["correct"]:
+            banned.add(a); continue
+        state, banned = new, set(skip)
+        out["steps"] += 1
+    if out["steps"] == 0 or state.src == ast.unparse(CodeState(src).fn):
+        return dict(out, steps=0)
+
+    perf = perf_case(cases)
+    t_old = pool.evaluate(name, head + src, cases, expected, perf, timing)
+    t_new = pool.evaluate(name, head + state.src, cases, expected, perf, timing)
+    if t_old["status"] != "ok" or t_new["status"] != "ok" or not t_new["correct"]:
+        return dict(out, status="unverified")
+    speedup, sig = compare(t_old["timing"], t_new["timing"])
+    return dict(out, status="optimized", src=state.src, t_old=t_old["timing"].median,
+                t_new=t_new["timing"].median, speedup=speedup, significant=sig)
+
+# -------- 进程池 --------
+_worker = {}
+
+def _init(policy_path, steps, skip, search=False):
+    torch.set_num_threads(1)
+    if search:
+        from search import search_function      # search 依赖本模块，延迟导入避免循环
+    _worker.update(policy=policy_fn(load_policy(policy_path)) if policy_path else None,
+                   agent=CodeTransformationAgent(), pool=EvalPool(1), steps=steps, skip=skip,
+                   run=search_function if search else optimize_function)
+
+def _job(item):
+    path, name, lineno, end, src, prelude = item
+    w = _worker
+    try:
+        r = w["run"](name, src, prelude, w["policy"], w["agent"], w["pool"],
+                     w["steps"], skip=w["skip"])
+    except Exception as e:                        # 单个函数出错不影响整批
+        r = {"status": "error", "src": src, "steps": 0, "speedup": 1.0, "error": repr(e)}
+    return dict(r, path=path, name=name, lineno=lineno, end_lineno=end)
+
+def rewrite(path, results):
+    """把一个文件里 optimized 的函数替换回去（按行号，从后往前）。"""
+    with open(path, encoding="utf-8") as f: lines = f.readlines()
+    old = list(lines)
+    for r in sorted(results, key=lambda r: -r["lineno"]):
+        lines[r["lineno"] - 1:r["end_lineno"]] = [l + "\n" for l in r["src"].splitlines()]
+    return old, lines
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RL code optimizer over .py files / directories")
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--policy", default="policy_final.pt",
+                    help="PolicyNet state_dict；传 none 则按动作顺序贪心")
+    ap.add_argument("--steps", type=int, default=10)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--min-speedup", type=float, default=1.05,
+                    help="加速比低于该值、或 Mann-Whitney 检验不显著的改写不写回")
+    ap.add_argument("--allow-rename", action="store_true",
+                    help="允许 rename_one_variable（会改参数名，破坏关键字调用）")
+    ap.add_argument("--search", action="store_true",
+                    help="用 best-first 搜索（search.py）代替单条贪心轨迹")
+    ap.add_argument("--write", action="store_true", help="原地写回，否则输出 diff")
+    args = ap.parse_args(argv)
+    policy = None if args.policy.lower() == "none" else args.policy
+    skip = () if args.allow_rename else (ACTIONS.index(rename_one_variable),)
+
+    by_file, n, n_opt = {}, 0, 0
+    with ProcessPoolExecutor(args.workers, initializer=_init,
+                             initargs=(policy, args.steps, skip, args.search)) as ex:
+        for r in ex.map(_job, iter_functions(args.paths), chunksize=16):
+            n += 1
+            sp = f"x{r['speedup']:.2f}" if r["status"] == "optimized" else ""
+            print(f"{r['path']}:{r['lineno']} {r['name']:<30} {r['status']:<10} {sp}",
+                  file=sys.stderr)
+            if (r["status"] == "optimized" and r.get("significant")
+                and r["speedup"] >= args.min_speedup):
+                by_file.setdefault(r["path"], []).append(r); n_opt += 1
+
+    for path, results in by_file.items():
+        old, new = rewrite(path, results)
+        if args.write:
+            with open(path, "w", encoding="utf-8") as f: f.writelines(new)
+        else:
+            sys.stdout.writelines(difflib.unified_diff(old, new, path, path))
+    print(f"{n_opt}/{n} functions optimized", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,50 @@
 import torch.nn as nn, torch.nn.functional as F, torch
+from transformation import ACTIONS
 
 class PolicyNet(nn.Module):
-    def __init__(self, obs_dim, act_dim):
+    def __init__(self, obs_dim, act_dim=None, value=False):
         super().__init__()
+        act_dim = act_dim or len(ACTIONS)           # 缺省跟着规则数走
         self.fc1 = nn.Linear(obs_dim, 64)
         self.fc2 = nn.Linear(64, 64)
         self.out = nn.Linear(64, act_dim)
+        self.v = nn.Linear(64, 1) if value else None    # PPO 的价值头，与策略共享躯干
+
+    def _trunk(self, x):
+        return F.relu(self.fc2(F.relu(self.fc1(x))))
 
     def forward(self, x):
-        x = F.relu(self.fc1(x))
-        x = F.relu(self.fc2(x))
-        return torch.softmax(self.out(x), -1)
+        return torch.softmax(self.out(self._trunk(x)), -1)
+
+    def heads(self, x):
+        """(动作概率, 状态价值)：一次躯干前向。"""
+        h = self._trunk(x)
+        return torch.softmax(self.out(h), -1), self.v(h).squeeze(-1)
+
+def grow_actions(sd, act_dim):
+    """
+    动作少于 act_dim 的旧 state_dict → 补齐输出层（ACTIONS 只往后加，旧下标不变）。
+    新动作的权重为 0、偏置取旧偏置的均值：起步时概率与旧动作的平均水平相当。
+    """
+    w, b = sd["out.weight"], sd["out.bias"]
+    k = act_dim - len(b)
+    if k <= 0: return sd
+    return dict(sd, **{"out.weight": torch.cat([w, w.new_zeros(k, w.shape[1])]),
+                       "out.bias": torch.cat([b, b.mean().expand(k)])})
+
+def restore(policy, opt, st):
+    """
+    续训：从 checkpoint 的 st["policy"] / st["opt"] 恢复，动作数不足时用 grow_actions 补齐。
+    动作数变了就不恢复 Adam 的矩（形状对不上）。返回动作数是否没变，调用方据此决定其余依赖动作数的状态要不要丢。
+    """
+    same = st["policy"]["out.bias"].shape[0] == policy.out.out_features
+    policy.load_state_dict(grow_actions(st["policy"], policy.out.out_features))
+    if same: opt.load_state_dict(st["opt"])
+    return same
+
+def load_policy(path):
+    """按 state_dict 里的形状重建 PolicyNet（eval 模式）；旧权重的动作数不足时补齐到 len(ACTIONS)。"""
+    sd = grow_actions(torch.load(path, map_location="cpu"), len(ACTIONS))
+    net = PolicyNet(sd["fc1.weight"].shape[1], sd["out.weight"].shape[0], "v.weight" in sd)
+    net.load_state_dict(sd)
+    return net.eval()
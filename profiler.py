@@ -0,0 +1,72 @@
+"""
+profiler.py  – 可选的分阶段计时（墙钟时间 + 调用次数）
+进程内共享一个 PROFILE；关闭时 stage() 直接返回空上下文，几乎没有开销。
+
+    with PROFILE.stage("parse"): ...
+    PROFILE.take()          # → {stage: [seconds, calls]}，并清零（按 episode 取）
+
+阶段是包含式的：step 包含 apply / sandbox / rm.*，apply 包含 parse / match / rule。
+"""
+import csv, time
+from collections import defaultdict
+from contextlib import nullcontext
+
+_NULL = nullcontext()
+
+class _Stage:
+    __slots__ = ("prof", "name", "t0")
+
+    def __init__(self, prof, name):
+        self.prof, self.name = prof, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        p = self.prof
+        p.t[self.name] += time.perf_counter() - self.t0
+        p.n[self.name] += 1
+
+class Profiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.t, self.n = defaultdict(float), defaultdict(int)
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _NULL
+
+    def take(self):
+        # 换新字典而不是 clear：后台线程（rm.fit）可能正往里写
+        t, n = self.t, self.n
+        self.t, self.n = defaultdict(float), defaultdict(int)
+        return {k: [t[k], c] for k, c in list(n.items())}
+
+PROFILE = Profiler()
+
+# -------- 汇总 & 导出 --------
+def merge(episodes):
+    """多个 episode 的 take() 结果相加。"""
+    tot = {}
+    for prof in episodes:
+        for k, (s, c) in prof.items():
+            a = tot.setdefault(k, [0.0, 0])
+            a[0] += s; a[1] += c
+    return tot
+
+def table(episodes):
+    """每阶段：总耗时、调用数、每 episode 毫秒、每次调用微秒、占 step 的比例。"""
+    tot, n = merge(episodes), max(len(episodes), 1)
+    step = tot.get("step", [0.0])[0] or 1.0
+    rows = [f"{'stage':<14}{'total_s':>9}{'calls':>9}{'ms/ep':>9}{'us/call':>10}{'%step':>7}"]
+    for k, (s, c) in sorted(tot.items(), key=lambda kv: -kv[1][0]):
+        rows.append(f"{k:<14}{s:>9.3f}{c:>9d}{s/n*1e3:>9.2f}{s/max(c, 1)*1e6:>10.1f}"
+                    f"{100*s/step:>7.1f}")
+    return "\n".join(rows)
+
+def write_csv(path, episodes):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["episode", "stage", "seconds", "calls"])
+        for ep, prof in enumerate(episodes):
+            for k, (s, c) in sorted(prof.items()):
+                w.writerow([ep, k, f"{s:.6g}", c])
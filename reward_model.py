@@ -1,33 +1,127 @@
 """
  pair-wise reward model using logistic-regression on cheap features.
+ 样本存在预分配的 float32 环形缓冲里；SGD 在线更新，只学上次 fit 之后的新样本。
 """
-import ast, re, numpy as np
-from sklearn.linear_model import LogisticRegression
+import ast, re, threading, numpy as np
+from collections import OrderedDict
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+from profiler import PROFILE
 
-def _feat(code: str) -> np.ndarray:
-    toks = re.split(r'\s+', code)
-    return np.array([len(code), len(toks),
-                     len(list(ast.walk(ast.parse(code)))),
-                     code.count('for'), code.count('if')],
-                    dtype=np.float32)
+N_FEAT = 5
+FEAT_CACHE_SIZE = 4096
+_feat_cache = OrderedDict()                 # 源码 → 特征（按 str 自带的 hash 查，有界 LRU）
+
+def _feat(code) -> np.ndarray:
+    # code 为源码串或 CodeState；CodeState 直接读已有的树并把结果缓存在自身
+    st = None if isinstance(code, str) else code
+    if st is not None and st.feat is not None: return st.feat
+    src = code if st is None else st.src
+    f = _feat_cache.get(src)
+    if f is not None:
+        _feat_cache.move_to_end(src)
+    else:
+        with PROFILE.stage("rm.feat"):
+            tree = ast.parse(src) if st is None else st.fn
+            nodes = sum(1 for _ in ast.walk(tree)) + (st is not None)   # +1：Module 节点
+            toks = re.split(r'\s+', src)
+            f = np.array([len(src), len(toks), nodes,
+                          src.count('for'), src.count('if')],
+                         dtype=np.float32)
+        _feat_cache[src] = f
+        if len(_feat_cache) > FEAT_CACHE_SIZE: _feat_cache.popitem(last=False)
+    if st is not None: st.feat = f
+    return f
 
 class PairwiseRewardModel:
-    def __init__(self):
-        self.clf = LogisticRegression(max_iter=1000)
-        self.X, self.y = [], []
+    def __init__(self, capacity=100_000, epochs=5, background=False):
+        self.clf = SGDClassifier(loss="log_loss", alpha=1e-4)
+        self.scaler = StandardScaler()
+        self.capacity, self.epochs, self.background = capacity, epochs, background
+        self.X = np.empty((min(1024, capacity), N_FEAT), dtype=np.float32)
+        self.y = np.empty(len(self.X), dtype=np.int8)
+        self.n = 0                          # 累计加入的样本数
+        self.fitted = 0                     # 已学过的样本数（n 的前缀）
+        self.pos = 0
+        self.params = None                  # (w, b)：折算了标准化的线性参数，score 只读它
         self.ready = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return min(self.n, self.capacity)
+
+    def __getstate__(self):
+        # 锁和线程不能 pickle；先等后台 fit 结束，保证 clf / scaler / params 一致
+        if self._thread is not None: self._thread.join()
+        with self._lock:
+            d = self.__dict__.copy()
+        d["_lock"] = d["_thread"] = None
+        return d
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        self._lock = threading.Lock()
+
+    def add(self, prev, new, heuristic_improved: bool):
+        with PROFILE.stage("rm.add"), self._lock:
+            i = self.n % self.capacity
+            if i >= len(self.X):                # 未到 capacity 前按倍数扩容
+                m = min(2 * len(self.X), self.capacity)
+                self.X = np.resize(self.X, (m, N_FEAT)); self.y = np.resize(self.y, m)
+            self.X[i] = _feat(new) - _feat(prev)
+            self.y[i] = int(heuristic_improved)
+            self.pos += int(heuristic_improved)
+            self.n += 1
 
-    def add(self, prev: str, new: str, heuristic_improved: bool):
-        self.X.append(_feat(new) - _feat(prev))
-        self.y.append(int(heuristic_improved))
+    def fit(self, background=None):
+        bg = self.background if background is None else background
+        if not bg:
+            return self._fit()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._fit, daemon=True)
+            self._thread.start()
 
-    def fit(self):
-        if len(self.y) < 30 or len(set(self.y)) < 2:
+    def _fit(self):
+        with PROFILE.stage("rm.fit"):       # 后台线程里跑时计入当时所在的 episode
+            self._fit_new()
+
+    def _fit_new(self):
+        with self._lock:
+            if self.n < 30 or self.pos in (0, self.n):
+                return
+            idx = np.arange(max(self.fitted, self.n - self.capacity), self.n) % self.capacity
+            X, y, self.fitted = self.X[idx], self.y[idx], self.n
+        if len(y) == 0:
             return
-        self.clf.fit(self.X, self.y)
+        self._learn(X, y)
+
+    def fit_batches(self, batches):
+        """从外部数据流（如 ExperienceReader.pairs）学习 (X, y) 小批，不经过环形缓冲。"""
+        with PROFILE.stage("rm.fit"):
+            for X, y in batches:
+                self._learn(np.asarray(X, dtype=np.float32), np.asarray(y))
+
+    def _learn(self, X, y):
+        self.scaler.partial_fit(X)
+        Z = self.scaler.transform(X)
+        for _ in range(self.epochs):
+            self.clf.partial_fit(Z, y, classes=(0, 1))
+        c = self.clf.coef_[0] / self.scaler.scale_
+        self.params = (c.astype(np.float32),
+                       float(self.clf.intercept_[0] - self.scaler.mean_ @ c))
         self.ready = True
 
-    def score(self, prev: str, new: str) -> float:
+    def score(self, prev, new) -> float:
         if not self.ready: return 0.0
-        diff = (_feat(new) - _feat(prev)).reshape(1, -1)
-        return float(self.clf.predict_proba(diff)[0, 1] - 0.5)  # [-0.5, +0.5]
+        with PROFILE.stage("rm.score"):
+            w, b = self.params
+            z = float((_feat(new) - _feat(prev)) @ w) + b
+            return float(0.5 * np.tanh(0.5 * z))  # sigmoid(z) - 0.5 ∈ [-0.5, +0.5]，不会溢出
+
+    def score_batch(self, pairs) -> np.ndarray:
+        """一次向量化地给多个 (prev, new) 打分，返回 float32 数组。"""
+        if not self.ready or not pairs: return np.zeros(len(pairs), dtype=np.float32)
+        w, b = self.params
+        D = np.stack([_feat(new) - _feat(prev) for prev, new in pairs])
+        return (0.5 * np.tanh(0.5 * (D @ w + b))).astype(np.float32)
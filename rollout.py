@@ -0,0 +1,115 @@
+"""
+rollout.py  – RolloutBuffer
+预分配的 rollout 张量：每个 env 一条进行中的轨迹 (n_envs, max_steps, ...)，
+episode 结束时整段拷进扁平的批缓冲，更新时一次前向即可。
+"""
+import torch
+
+class RolloutBuffer:
+    def __init__(self, n_envs, max_steps, obs_dim, act_dim, max_episodes):
+        E, T = n_envs, max_steps
+        self.cur_obs = torch.zeros(E, T, obs_dim)
+        self.cur_mask = torch.zeros(E, T, act_dim, dtype=torch.bool)
+        self.cur_act = torch.zeros(E, T, dtype=torch.long)
+        self.cur_rew = torch.zeros(E, T)
+        self.t = torch.zeros(E, dtype=torch.long)        # 每个 env 当前轨迹长度
+        self._envs = torch.arange(E)
+
+        N = max_episodes * T
+        self.obs = torch.zeros(N, obs_dim)
+        self.mask = torch.zeros(N, act_dim, dtype=torch.bool)
+        self.act = torch.zeros(N, dtype=torch.long)
+        self.rew = torch.zeros(N)
+        self.ep = torch.zeros(N, dtype=torch.long)       # 每条 transition 属于第几个 episode
+        self.ret = torch.zeros(max_episodes)
+        self.n = self.n_ep = 0
+
+    def add(self, S, M, A, R):
+        """写入所有 env 的一步 (obs, mask, action, reward)。"""
+        e, t = self._envs, self.t
+        self.cur_obs[e, t] = torch.as_tensor(S, dtype=torch.float32)
+        self.cur_mask[e, t] = torch.as_tensor(M)
+        self.cur_act[e, t] = torch.as_tensor(A, dtype=torch.long)
+        self.cur_rew[e, t] = torch.as_tensor(R, dtype=torch.float32)
+        self.t += 1
+
+    def finish(self, i, keep=True):
+        """env i 的 episode 结束：keep 时拷进批缓冲并返回回报 G，否则丢弃。"""
+        t = int(self.t[i]); self.t[i] = 0
+        if not keep: return None
+        s = slice(self.n, self.n + t)
+        self.obs[s], self.mask[s] = self.cur_obs[i, :t], self.cur_mask[i, :t]
+        self.act[s], self.rew[s] = self.cur_act[i, :t], self.cur_rew[i, :t]
+        self.ep[s] = self.n_ep
+        G = float(self.cur_rew[i, :t].sum())
+        self.ret[self.n_ep] = G
+        self.n += t; self.n_ep += 1
+        return G
+
+    def batch(self):
+        n = self.n
+        return self.obs[:n], self.mask[:n], self.act[:n], self.ep[:n], self.ret[:self.n_ep]
+
+    def clear(self):
+        self.n = self.n_ep = 0
+
+    def state_dict(self):
+        """已完成、还没用于更新的 episode；进行中的轨迹不存。"""
+        n = self.n
+        return {"obs": self.obs[:n], "mask": self.mask[:n], "act": self.act[:n],
+                "rew": self.rew[:n], "ep": self.ep[:n], "ret": self.ret[:self.n_ep]}
+
+    def load_state_dict(self, d):
+        self.t.zero_()
+        self.n, self.n_ep = len(d["act"]), len(d["ret"])
+        for k in ("obs", "mask", "act", "rew", "ep"):
+            getattr(self, k)[:self.n] = d[k]
+        self.ret[:self.n_ep] = d["ret"]
+
+class StepBuffer:
+    """
+    PPO 用的定长 rollout：n_envs 个 env 各走 n_steps 步，(T, E, ...) 预分配；
+    episode 边界由 done 标记，GAE 按 done 截断，不必按 episode 拆开。
+    """
+    def __init__(self, n_steps, n_envs, obs_dim, act_dim):
+        T, E = n_steps, n_envs
+        self.obs = torch.zeros(T, E, obs_dim)
+        self.mask = torch.zeros(T, E, act_dim, dtype=torch.bool)
+        self.act = torch.zeros(T, E, dtype=torch.long)
+        self.logp = torch.zeros(T, E)
+        self.rew = torch.zeros(T, E)
+        self.done = torch.zeros(T, E)
+        self.val = torch.zeros(T, E)
+        self.t = 0
+
+    def full(self):
+        return self.t == len(self.act)
+
+    def add(self, S, M, A, logp, R, D, V):
+        t = self.t
+        self.obs[t] = torch.as_tensor(S, dtype=torch.float32)
+        self.mask[t] = torch.as_tensor(M)
+        self.act[t], self.logp[t], self.val[t] = A, logp, V
+        self.rew[t] = torch.as_tensor(R, dtype=torch.float32)
+        self.done[t] = torch.as_tensor(D, dtype=torch.float32)
+        self.t += 1
+
+    def gae(self, last_val, gamma=0.99, lam=0.95):
+        """(advantage, return)，形状 (T, E)；last_val 是最后一步之后那个 obs 的价值。"""
+        adv, g = torch.zeros_like(self.rew), torch.zeros_like(last_val)
+        for t in reversed(range(self.t)):
+            nxt = last_val if t == self.t - 1 else self.val[t + 1]
+            live = 1.0 - self.done[t]
+            delta = self.rew[t] + gamma * nxt * live - self.val[t]
+            g = delta + gamma * lam * live * g
+            adv[t] = g
+        return adv, adv + self.val
+
+    def flat(self, *extra):
+        """(T, E, ...) → (T·E, ...)：obs, mask, act, logp 以及 extra 里的 (T, E) 张量。"""
+        n = self.t
+        return [x[:n].reshape(n * x.shape[1], *x.shape[2:])
+                for x in (self.obs, self.mask, self.act, self.logp) + extra]
+
+    def clear(self):
+        self.t = 0
@@ -0,0 +1,144 @@
+"""
+sandbox.py  – EvalPool
+预先 fork 好的常驻 evaluator 进程池：候选代码在子进程里 exec / 跑测试 / 计时，
+带 wall-time 超时、CPU 时间和内存上限；worker 崩溃或超时后自动重启。
+"""
+import marshal, multiprocessing as mp, os, queue
+from timing import measure
+from scaling import measure_ladder
+from memory import measure_memory
+
+try:
+    import resource
+except ImportError:                     # 非 POSIX：只剩 wall-time 超时
+    resource = None
+
+def run_cases(fn, cases):
+    """逐个用例调用 fn，返回 [(返回值, 异常类型名)]。"""
+    out = []
+    for case in cases:
+        try: out.append((fn(*case), None))
+        except Exception as e: out.append((None, type(e).__name__))
+    return out
+
+def check_cases(fn, cases, expected):
+    """只跑候选函数，和冻结的参考输出逐个比对，第一个不一致即返回 False。"""
+    for case, (r_ref, e_ref) in zip(cases, expected):
+        try: r_new, e_new = fn(*case), None
+        except Exception as e: r_new, e_new = None, type(e).__name__
+        if e_ref or e_new:
+            if e_ref != e_new: return False
+        elif r_ref != r_new: return False
+    return True
+
+# -------- worker --------
+def _limit_memory(limit):
+    # 在 fork 时已有的地址空间之上再允许 limit 字节
+    if resource is None or not limit: return
+    with open("/proc/self/statm") as f:
+        used = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (used + limit, hard))
+
+def _limit_cpu(limit):
+    # RLIMIT_CPU 是进程累计值，所以每次评估前在已用时间上再放宽 limit 秒
+    if resource is None or not limit: return
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(ru.ru_utime + ru.ru_stime) + 1 + int(limit)
+    if hard != resource.RLIM_INFINITY: soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _worker(conn, mem_limit, cpu_limit):
+    try: _limit_memory(mem_limit)
+    except (OSError, ValueError): pass
+    while True:
+        try: msg = conn.recv()
+        except (EOFError, KeyboardInterrupt): break
+        if msg is None: break
+        name, source, tests, expected, perf, timing, scaling, memory = msg
+        try:
+            _limit_cpu(cpu_limit)
+            ns = {"print": lambda *a, **k: None}
+            exec(marshal.loads(source) if isinstance(source, bytes) else source, ns)
+            fn = ns[name]
+            if expected is None:                        # 没有参考输出：只回传输出
+                res = {"status": "ok", "outputs": run_cases(fn, tests)}
+            else:
+                ok = check_cases(fn, tests, expected)
+                res = {"status": "ok", "correct": ok,   # 不正确就不必计时
+                       "timing": measure(fn, perf, **timing)
+                                 if ok and perf is not None and timing is not None else None}
+                if ok and scaling and timing is not None:   # (阶梯输入, 每级的计时参数)
+                    res["scaling"] = measure_ladder(fn, scaling[0], **scaling[1])
+                if ok and memory and perf is not None:  # 计时之后单独跑：tracemalloc 会拖慢计时
+                    # 与进程内一致：量不出内存只是没有内存项，不影响正确性
+                    try: res["memory"] = measure_memory(fn, perf)
+                    except Exception: res["memory"] = None
+        except MemoryError:
+            res = {"status": "memory"}
+        except BaseException as e:
+            res = {"status": "error", "error": repr(e)}
+        try:
+            conn.send(res)
+        except Exception as e:          # 返回值无法 pickle 等
+            conn.send({"status": "error", "error": repr(e)})
+
+# -------- pool --------
+class EvalPool:
+    def __init__(self, n_workers=1, timeout=2.0, mem_limit=256 << 20, cpu_limit=2,
+                 start_method=None):
+        self.timeout, self.mem_limit, self.cpu_limit = timeout, mem_limit, cpu_limit
+        method = start_method or ("fork" if "fork" in mp.get_all_start_methods() else None)
+        self.ctx = mp.get_context(method)
+        self.idle = queue.Queue()
+        self.workers = []
+        self.restarts = 0
+        for _ in range(n_workers): self.idle.put(self._spawn())
+
+    def _spawn(self):
+        conn, child = self.ctx.Pipe()
+        p = self.ctx.Process(target=_worker, args=(child, self.mem_limit, self.cpu_limit),
+                             daemon=True)
+        p.start(); child.close()
+        w = (p, conn)
+        self.workers.append(w)
+        return w
+
+    def _kill(self, w):
+        p, conn = w
+        p.kill(); p.join(); conn.close()
+        self.workers.remove(w)
+
+    def evaluate(self, name, source, tests, expected, perf=None, timing=None, scaling=None,
+                 memory=False, timed=True):
+        """
+        在某个空闲 worker 里评估候选代码（source 为源码或 marshal 后的 code object，
+        expected 为 run_cases 得到的参考输出），返回
+        {"status": ok|error|memory|timeout|crash, "correct": bool, "timing": Timing}。
+        scaling=(ladder, timing) 时正确的候选还在阶梯输入上计时，结果在 "scaling"（Scaling 或 None）。
+        memory=True 时正确的候选在 perf 上再跑一次 tracemalloc，结果在 "memory"（Memory）。
+        timed=False 时不计时（也不跑阶梯），"timing" 为 None。
+        expected=None 时只跑用例，返回 {"status": ..., "outputs": run_cases(...)}。
+        线程安全：并发调用会各自占用一个 worker。
+        """
+        w = self.idle.get()
+        p, conn = w
+        try:
+            conn.send((name, source, tests, expected, perf, (timing or {}) if timed else None,
+                       scaling, memory))
+            res = conn.recv() if conn.poll(self.timeout) else {"status": "timeout"}
+        except (EOFError, OSError):
+            res = {"status": "crash"}
+        if res["status"] in ("timeout", "crash"):
+            self._kill(w); w = self._spawn(); self.restarts += 1
+        self.idle.put(w)
+        return res
+
+    def close(self):
+        for p, conn in list(self.workers):
+            try: conn.send(None)
+            except OSError: pass
+            p.join(timeout=1)
+            if p.is_alive(): p.kill()
+        self.workers.clear()
@@ -0,0 +1,69 @@
+"""
+scaling.py  – 输入规模阶梯计时 + 经验复杂度拟合
+从函数的计时输入（参数元组）出发，按参数类型把每个参数放大到几何增长的规模 n，
+逐级计时后在 log-log 上做最小二乘，斜率即经验复杂度指数（O(n) ≈ 1，O(n²) ≈ 2）。
+"""
+import itertools, math, numpy as np
+from timing import measure, compare
+
+SIZES = (32, 128, 512, 2048)
+
+def scale_value(v, n):
+    """把单个参数放大到规模 n；不随规模变化的标量（bool / None / float …）原样返回。"""
+    if isinstance(v, bool) or v is None:
+        return v
+    if isinstance(v, int):
+        return n                                      # 整数参数多半是规模 / 循环次数
+    if isinstance(v, str):
+        s = v or "a"
+        return (s * (n // len(s) + 1))[:n]
+    if isinstance(v, (list, tuple)):
+        items = list(itertools.islice(itertools.cycle(v), n)) if v else list(range(n))
+        return type(v)(items)
+    if isinstance(v, (set, frozenset)):
+        return type(v)(range(n))
+    if isinstance(v, dict):
+        vals = itertools.cycle(v.values() or [0])
+        if all(isinstance(k, str) for k in v):
+            return {f"k{i}": next(vals) for i in range(n)}
+        return {i: next(vals) for i in range(n)}
+    return v
+
+def ladder(args, sizes=SIZES):
+    """[(n, args_n)]；没有任何参数会随 n 变化时返回 []。"""
+    out = [(n, tuple(scale_value(a, n) for a in args)) for n in sizes]
+    return out if out and out[0][1] != out[-1][1] else []
+
+def fit_exponent(sizes, seconds):
+    """log t = k log n + c 的最小二乘斜率 k。"""
+    x, y = np.log(sizes), np.log(np.maximum(seconds, 1e-9))
+    return float(np.polyfit(x, y, 1)[0])
+
+class Scaling:
+    def __init__(self, sizes, timings):
+        self.sizes, self.timings = list(sizes), timings
+        # 减去计时框架自身的开销，否则小规模被常数项压平、指数偏小
+        self.exponent = fit_exponent(self.sizes, [t.median - t.overhead for t in timings])
+
+    @property
+    def large(self):
+        return self.timings[-1]                       # 最大规模上的 Timing
+
+    def __repr__(self):
+        return f"Scaling(exponent={self.exponent:.2f}, sizes={self.sizes})"
+
+def measure_ladder(fn, lad, **timing):
+    """逐级计时；某一级抛异常（输入超出函数定义域）则返回 None。"""
+    if not lad: return None
+    try:
+        return Scaling([n for n, _ in lad], [measure(fn, a, **timing) for _, a in lad])
+    except Exception:
+        return None
+
+def scaling_terms(prev, new, alpha=0.05):
+    """(指数下降量, 最大规模上的加速比, 该加速是否显著)；任一方没有结果时为 (0, 1, False)。"""
+    if prev is None or new is None:
+        return 0.0, 1.0, False
+    sp, sig = compare(prev.large, new.large, alpha)
+    d = prev.exponent - new.exponent
+    return (d if math.isfinite(d) else 0.0), sp, sig
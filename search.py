@@ -0,0 +1,90 @@
+"""
+search.py  – best-first 搜索推理模式（带置换表）
+每个状态展开 PolicyNet 概率最高的 k 个可用动作（的每个匹配位置），
+按 alpha-renamed 的规范 AST hash 去重，同一规范状态只验证 + 计时一次，
+在节点 / 时间预算内返回验证通过且最快的版本。
+"""
+import ast, hashlib, heapq, itertools, math, time, numpy as np
+from agent import CodeState
+from env import observe
+from optimize import reference_cases, perf_case
+from timing import compare
+
+def canonical_hash(state: CodeState) -> str:
+    """
+    参数和局部变量改名为 _0, _1, ... 后的 AST hash。两遍：先按遍历顺序收集参数和所有被赋值的名字，
+    再改掉它们的全部出现（包括先读后写的）；只读不写的全局名保持原样。
+    """
+    fn = ast.parse(state.src).body[0]
+    names = {}
+    for node in ast.walk(fn):
+        if isinstance(node, ast.arg):
+            names.setdefault(node.arg, f"_{len(names)}")
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.setdefault(node.id, f"_{len(names)}")
+    for node in ast.walk(fn):
+        if isinstance(node, ast.arg):
+            node.arg = names[node.arg]
+        elif isinstance(node, ast.Name) and node.id in names:
+            node.id = names[node.id]
+    return hashlib.blake2b(ast.dump(fn).encode(), digest_size=16).hexdigest()
+
+def search_function(name, src, prelude, policy, agent, pool, steps=10, timing=None, skip=(),
+                    k=3, max_nodes=64, time_budget=10.0):
+    """
+    参数与 optimize.optimize_function 相同（steps 为最大深度），另返回
+    "nodes"（展开的节点数）和 "evaluations"（实际送进沙箱的次数）。
+    """
+    timing = timing or dict(repeat=5, budget=0.05)
+    head = prelude + "\n" if prelude else ""
+    root = CodeState(src)
+    out = {"status": "unchanged", "src": src, "steps": 0, "speedup": 1.0,
+           "nodes": 0, "evaluations": 0}
+    ref = reference_cases(name, head + src, root.fn, pool)
+    if ref is None:
+        return dict(out, status="unverified")
+    cases, expected = ref
+    perf = perf_case(cases)
+
+    table = {}                                          # 规范 hash → Timing（None=未通过）
+    def evaluate(st):
+        r = pool.evaluate(name, head + st.src, cases, expected, perf, timing)
+        out["evaluations"] += 1
+        return r["timing"] if r["status"] == "ok" and r["correct"] else None
+
+    t_root = evaluate(root)
+    if t_root is None:
+        return dict(out, status="unverified")
+    table[canonical_hash(root)] = t_root
+    best = (t_root.median, len(root), 0, root, t_root)
+    tie = itertools.count()
+    heap = [(0.0, next(tie), 0, root)]                  # (-累计 log-prob, tie, 深度, state)
+    deadline = time.perf_counter() + time_budget
+    while heap and out["nodes"] < max_nodes and time.perf_counter() < deadline:
+        cost, _, depth, st = heapq.heappop(heap)
+        out["nodes"] += 1
+        if depth >= steps: continue
+        mask = np.array(agent.mask(st), dtype=bool)
+        mask[list(skip)] = False
+        p = np.ones(len(mask)) / len(mask)
+        if policy is not None:
+            probs = policy(observe(st)); n = min(len(p), len(probs))
+            p[:] = 1e-6; p[:n] = probs[:n]
+        for a in sorted(np.flatnonzero(mask), key=lambda a: -p[a])[:k]:
+            for j in range(len(agent.matches(st)[a])):
+                child, changed = agent.apply(st.fork(), int(a), j)
+                if not changed: continue
+                h = canonical_hash(child)
+                if h in table: continue                 # 置换：这个规范状态已经评估过
+                t = table[h] = evaluate(child)
+                if t is None: continue
+                if (t.median, len(child)) < best[:2]:
+                    best = (t.median, len(child), depth + 1, child, t)
+                heapq.heappush(heap, (cost - math.log(p[a] + 1e-12), next(tie), depth + 1, child))
+
+    _, _, depth, st, t_best = best
+    if st is root:
+        return out
+    speedup, sig = compare(t_root, t_best)
+    return dict(out, status="optimized", src=st.src, steps=depth, t_old=t_root.median,
+                t_new=t_best.median, speedup=speedup, significant=sig)
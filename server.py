@@ -0,0 +1,155 @@
+"""
+server.py  – 常驻优化服务（HTTP）
+
+    python server.py --policy policy_final.pt --port 8765 --workers 4
+
+POST /optimize  {"source": "def f(...): ...", "prelude": "import math", "steps": 10,
+                 "search": false}
+    → {"status", "source", "speedup", "steps", "t_old", "t_new", "latency_ms"}
+GET  /metrics   → 延迟 p50 / p99、进行中请求数、微批队列深度、平均批大小
+
+PolicyNet 只加载一次；并发请求的每一步策略前向由 MicroBatcher 合成一次批量前向，
+改写在请求线程里做，验证和计时交给共享的 EvalPool。
+"""
+import argparse, ast, json, queue, threading, time, numpy as np, torch
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from agent import CodeTransformationAgent
+from optimize import optimize_function
+from search import search_function
+from policy import load_policy
+from sandbox import EvalPool
+from transformation import ACTIONS, rename_one_variable
+
+class MicroBatcher:
+    """把并发的单条 obs 攒成一批（最多 max_batch 条或等 max_wait 秒）做一次前向。"""
+    def __init__(self, net, max_batch=64, max_wait=0.002):
+        self.net, self.max_batch, self.max_wait = net, max_batch, max_wait
+        self.q = queue.Queue()
+        self.batches = self.items = 0
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def __call__(self, obs):
+        fut = Future()
+        self.q.put((obs, fut))
+        return fut.result()
+
+    def _loop(self):
+        while True:
+            items = [self.q.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(items) < self.max_batch:
+                t = deadline - time.perf_counter()
+                if t <= 0: break
+                try: items.append(self.q.get(timeout=t))
+                except queue.Empty: break
+            try:
+                with torch.no_grad():
+                    P = self.net(torch.as_tensor(np.stack([o for o, _ in items])).float()).numpy()
+                for (_, fut), p in zip(items, P): fut.set_result(p)
+            except Exception as e:
+                for _, fut in items: fut.set_exception(e)
+            self.batches += 1; self.items += len(items)
+
+class Metrics:
+    def __init__(self, window=10000):
+        self.lat = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.in_flight = self.total = self.errors = 0
+
+    def begin(self):
+        with self.lock: self.in_flight += 1; self.total += 1
+
+    def end(self, seconds, ok=True):
+        with self.lock:
+            self.in_flight -= 1; self.lat.append(seconds)
+            if not ok: self.errors += 1
+
+    def snapshot(self, batcher):
+        with self.lock: lat = np.array(self.lat) * 1000
+        p50, p99 = (np.percentile(lat, [50, 99]) if len(lat) else (0.0, 0.0))
+        return {"requests": self.total, "errors": self.errors, "in_flight": self.in_flight,
+                "queue_depth": batcher.q.qsize() if batcher else 0,
+                "latency_p50_ms": float(p50), "latency_p99_ms": float(p99),
+                "avg_batch": batcher.items / batcher.batches if batcher and batcher.batches else 0.0}
+
+class Handler(BaseHTTPRequestHandler):
+    app = None                                  # serve() 里填：dict(policy, agent, pool, ...)
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics": self._reply(200, self.app["metrics"].snapshot(self.app["policy"]))
+        elif self.path == "/healthz": self._reply(200, {"ok": True})
+        else: self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/optimize":
+            return self._reply(404, {"error": "not found"})
+        app, t0 = self.app, time.perf_counter()
+        app["metrics"].begin()
+        ok = False
+        try:
+            n = int(self.headers.get("Content-Length", 0))
+            if n > app["max_body"]:
+                return self._reply(413, {"error": "request too large"})
+            req = json.loads(self.rfile.read(n))
+            src = req["source"]
+            fns = [x for x in ast.parse(src).body if isinstance(x, ast.FunctionDef)]
+            if len(fns) != 1:
+                return self._reply(400, {"error": "source must contain exactly one function"})
+            run = search_function if req.get("search") else optimize_function
+            r = run(fns[0].name, ast.get_source_segment(src, fns[0]),
+                    req.get("prelude", ""), app["policy"], app["agent"],
+                    app["pool"], min(int(req.get("steps", 10)), app["max_steps"]),
+                    skip=() if req.get("allow_rename") else app["skip"])
+            ok = True
+            self._reply(200, {"status": r["status"], "source": r["src"], "speedup": r["speedup"],
+                              "steps": r["steps"], "t_old": r.get("t_old"), "t_new": r.get("t_new"),
+                              "latency_ms": (time.perf_counter() - t0) * 1000})
+        except (ValueError, KeyError, TypeError, SyntaxError) as e:   # 请求体格式不对
+            self._reply(400, {"error": repr(e)})
+        except Exception as e:                          # 其余都是服务端的错，连接不能不回就断
+            self._reply(500, {"error": repr(e)})
+        finally:
+            app["metrics"].end(time.perf_counter() - t0, ok)
+
+    def log_message(self, *args):
+        pass
+
+def serve(policy_path, host="127.0.0.1", port=8765, workers=4, max_steps=20):
+    batcher = MicroBatcher(load_policy(policy_path)) if policy_path else None
+    Handler.app = dict(policy=batcher, agent=CodeTransformationAgent(),
+                       pool=EvalPool(workers), metrics=Metrics(), max_steps=max_steps,
+                       max_body=1 << 20, skip=(ACTIONS.index(rename_one_variable),))
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    return srv
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="RL code optimizer service")
+    ap.add_argument("--policy", default="policy_final.pt", help="传 none 则按动作顺序贪心")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=4, help="EvalPool 验证进程数")
+    args = ap.parse_args(argv)
+    srv = serve(None if args.policy.lower() == "none" else args.policy,
+                args.host, args.port, args.workers)
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        Handler.app["pool"].close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import ast
+from agent import CodeState, CodeTransformationAgent
+from functions import functions
+from transformation import ACTIONS, transform_list_append, bind_locals
+
+def test_second_apply_on_same_state_uses_own_tree():
+    # 第一次改写把树交给了新 state；旧 state 上的第二次改写不能动到那棵树
+    ag = CodeTransformationAgent()
+    st = CodeState(functions["double_list"])
+    src = st.src
+    a, changed_a = ag.apply(st, ACTIONS.index(transform_list_append))
+    a_src = a.src
+    b, changed_b = ag.apply(st, ACTIONS.index(bind_locals))
+    assert changed_a and changed_b
+    assert st.src == src
+    assert a.src == a_src
+    assert b.src != src and "_res_append" in b.src
+    ast.parse(b.src)
+
+def test_mask_after_handoff():
+    ag = CodeTransformationAgent()
+    st = CodeState(functions["double_list"])
+    mask = list(ag.mask(st))
+    ag.apply(st, ACTIONS.index(transform_list_append))
+    assert ag.mask(st) == mask
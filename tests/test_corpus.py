@@ -0,0 +1,11 @@
+from corpus import DirCorpus, References
+
+def test_dir_corpus_skips_files_without_functions(tmp_path):
+    (tmp_path / "__init__.py").write_text("")
+    (tmp_path / "bad.py").write_text("def (\n")
+    (tmp_path / "good.py").write_text("def f(x):\n    return x + 1\n")
+    c = DirCorpus(str(tmp_path))
+    entries = [c.entry(i) for i in range(len(c))]
+    assert [e and e["name"] for e in entries] == [None, None, "f"]
+    refs = References(c)
+    assert refs[0] is None and refs[1] is None and refs[2]["name"] == "f"
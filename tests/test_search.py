@@ -0,0 +1,16 @@
+from agent import CodeState
+from search import canonical_hash
+
+def h(src):
+    return canonical_hash(CodeState(src))
+
+def test_alpha_equivalent_states_hash_equal():
+    # return 里的读在 BFS 中先于循环体里的赋值被访问，也要改名
+    a = "def f(xs):\n    for x in xs:\n        total = x\n    return total"
+    b = "def f(xs):\n    for x in xs:\n        t = x\n    return t"
+    assert h(a) == h(b)
+
+def test_local_and_global_do_not_collide():
+    local = "def f(xs):\n    for x in xs:\n        total = x\n    return total"
+    glob = "def f(xs):\n    for x in xs:\n        t = x\n    return total"
+    assert h(local) != h(glob)
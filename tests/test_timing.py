@@ -0,0 +1,13 @@
+import time
+from timing import measure
+
+def test_budget_caps_slow_functions():
+    # 单次 50ms、budget 20ms：只跑 warmup 那一次
+    s = time.perf_counter()
+    t = measure(lambda: time.sleep(0.05), budget=0.02)
+    assert time.perf_counter() - s < 0.1
+    assert len(t.samples) == 1 and t.median >= 0.05
+
+def test_fast_functions_keep_all_repeats():
+    t = measure(lambda: sum(range(10)), repeat=5, budget=0.05)
+    assert len(t.samples) == 5
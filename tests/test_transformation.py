@@ -0,0 +1,167 @@
+import ast, pytest
+from sandbox import run_cases
+from transformation import (EXAMPLES, find_matches, ACTIONS, hoist_loop_invariant, bind_locals,
+                            transform_str_join, transform_in_set, transform_any_all,
+                            transform_nested_append, transform_range_len)
+
+def rewrite(rule, src):
+    fn = ast.parse(src).body[0]
+    changed = rule(fn)
+    return changed, ast.unparse(fn)
+
+def outputs(src, cases):
+    ns = {}
+    exec(src, ns)
+    return run_cases(ns["f"], cases)
+
+def matches(rule, src):
+    return find_matches(ast.parse(src).body[0])[ACTIONS.index(rule)]
+
+# -------- 正例：改写后在空输入 / 会抛异常的输入上也与原函数一致 --------
+EQUIV = [
+    (hoist_loop_invariant, EXAMPLES[hoist_loop_invariant],
+     [([], 3), ([1, 2], 3), ([1, "a"], 2), (None, 1), ([1], None), ([], None)]),
+    (bind_locals, EXAMPLES[bind_locals], [([],), ([-1, 2],), (["a"],), (None,)]),
+    # 空循环：绑定语句在循环前总会执行，取方法本身不能抛异常
+    (bind_locals, """
+def f(xs):
+    d = {}
+    for x in xs:
+        d.setdefault(x % 3, []).append(x)
+    return d""", [([],), ([1, 4, 2],), (["a"],), (None,)]),
+    (transform_str_join, EXAMPLES[transform_str_join], [("",), ("foo",), (["a", 1],), (None,)]),
+    # 已知前提：in 左边的值必须可 hash（[[1]] 这类输入改写后抛 TypeError），见 _site_in_set
+    (transform_in_set, EXAMPLES[transform_in_set],
+     [([], []), ([1, 5], [5]), ((2, "a"), ["a"]), (None, [1]), ([1], None)]),
+    (transform_any_all, EXAMPLES[transform_any_all], [([],), ([1, 2],), ([3],), (None,)]),
+    (transform_any_all, """
+def f(xs):
+    found = False
+    for x in xs:
+        if 12 // x > 3:
+            found = True
+            break
+    return found""", [([],), ([1, 0],), ([0, 1],), ([5, 6],), (["a"],)]),
+    (transform_nested_append, EXAMPLES[transform_nested_append],
+     [([], [1]), ([1, 2], []), ([1, 2], [2, 3]), ([1, "a"], [2]), (None, [1])]),
+    (transform_range_len, EXAMPLES[transform_range_len],
+     [([],), ([1, 2, 3],), ("ab",), ([1, "a"],), (None,)]),
+]
+
+@pytest.mark.parametrize("rule, src, cases", EQUIV, ids=lambda v: getattr(v, "__name__", ""))
+def test_rewrite_is_equivalent(rule, src, cases):
+    changed, new = rewrite(rule, src)
+    assert changed
+    assert outputs(new, cases) == outputs(src, cases)
+
+# -------- 反例：守卫条件不满足时不得匹配 --------
+NEGATIVE = {
+    hoist_loop_invariant: [
+        # 表达式用到循环变量
+        "def f(xs):\n    r = []\n    for x in xs:\n        n = x * 2\n        r.append(n)\n    return r",
+        # 表达式里的名字在循环里被原地修改
+        "def f(xs):\n    r = []\n    for x in xs:\n        n = len(r) + 1\n        r.append(n)\n    return r",
+        # 目标在循环之后还被读
+        "def f(xs):\n    m = len(xs)\n    t = 0\n    for x in xs:\n        n = m * 2\n        t += x\n    return n",
+        # 目标在赋值之前已被读
+        "def f(xs):\n    m = len(xs)\n    n = 0\n    for x in xs:\n        t = n\n        n = m * 2\n    return 0",
+        # 目标出现在循环的可迭代对象里：外提后 for 遍历的是新值
+        "def f(xs):\n    n = xs\n    m = len(xs)\n    out = []\n    for x in n:\n        n = m * 2\n        out.append(x)\n    return out",
+        # 空循环时原函数不会求值的可能抛异常的表达式
+        "def f(xs, ys):\n    t = 0\n    for x in xs:\n        m = max(ys)\n        t += m\n    return t",
+        "def f(xs, k):\n    t = 0\n    for x in xs:\n        m = 10 // k\n        t += m\n    return t",
+        "def f(xs, k):\n    out = []\n    for x in xs:\n        n = len(xs) * k\n        out.append(x + n)\n    return out",
+        # 名字不一定已绑定为 int
+        "def f(xs, c):\n    if c:\n        m = 1\n    t = 0\n    for x in xs:\n        n = m * 2\n        t += n\n    return t",
+        "def f(xs):\n    m = 1\n    m = str(m)\n    t = []\n    for x in xs:\n        n = m * 2\n        t.append(n)\n    return t",
+    ],
+    bind_locals: [
+        # 对象在循环里被重新绑定
+        "def f(xs):\n    out = []\n    for x in xs:\n        out.append(x)\n        out = [x]\n    return out",
+        # 内置函数在循环里被遮蔽
+        "def f(xs):\n    for x in xs:\n        len = x\n        len(xs)\n    return 0",
+        # 内置函数在函数别处被遮蔽
+        "def f(xs, c):\n    for x in xs:\n        len(x)\n    if c:\n        len = c\n    return 0",
+        # 对象类型未知：空循环时原函数不会访问 o.m
+        "def f(xs, o):\n    for x in xs:\n        o.m(x)\n    return 0",
+        # 容器上没有这个方法
+        "def f(xs):\n    out = []\n    for x in xs:\n        out.add(x)\n    return out",
+        # 局部名冲突
+        "def f(xs):\n    _len = 1\n    for x in xs:\n        y = _len + len(xs)\n    return _len",
+    ],
+    transform_str_join: [
+        # 累加项里用到累加变量本身
+        "def f(s):\n    r = ''\n    for c in s:\n        r += r + c\n    return r",
+        # 循环变量在之后还被用到
+        "def f(s):\n    r = ''\n    for c in s:\n        r += c\n    return r + c",
+        # 初值不是空串
+        "def f(s):\n    r = 'x'\n    for c in s:\n        r += c\n    return r",
+        # for-else
+        "def f(s):\n    r = ''\n    for c in s:\n        r += c\n    else:\n        r = '!'\n    return r",
+    ],
+    transform_in_set: [
+        # 列表在循环里被修改
+        "def f(xs):\n    seen = []\n    for x in xs:\n        if x in seen:\n            continue\n        seen.append(x)\n    return seen",
+        # 列表在循环之后才赋值
+        "def f(xs, seen):\n    for x in xs:\n        if x in seen:\n            return 1\n    seen = list(xs)\n    return 0",
+        # 非常量列表字面量
+        "def f(xs, a):\n    for x in xs:\n        if x in [a, 1]:\n            return 1\n    return 0",
+        # 列表赋值之后、循环之前又被重新绑定（字符串的 in 是子串判断）
+        "def f(xs):\n    seen = []\n    seen = 'abc'\n    n = 0\n    for x in xs:\n        if x in seen:\n            n += 1\n    return n",
+        "def f(xs, c):\n    seen = []\n    if c:\n        seen = 'abc'\n    n = 0\n    for x in xs:\n        if x in seen:\n            n += 1\n    return n",
+        # 局部名冲突
+        "def f(xs, ys):\n    seen = list(ys)\n    _seen_set = 0\n    for x in xs:\n        if x in seen:\n            return 1\n    return 0",
+    ],
+    transform_any_all: [
+        # 没有 break：原循环对每个元素都求值
+        "def f(xs):\n    found = False\n    for x in xs:\n        if 12 // x > 3:\n            found = True\n    return found",
+        # 条件里读标志本身
+        "def f(xs):\n    found = False\n    for x in xs:\n        if x and not found:\n            found = True\n            break\n    return found",
+        # 赋的值和初值相同
+        "def f(xs):\n    found = False\n    for x in xs:\n        if x:\n            found = False\n            break\n    return found",
+        # 循环变量在之后还被用到
+        "def f(xs):\n    found = False\n    for x in xs:\n        if x:\n            found = True\n            break\n    return x",
+        # 两个 return 的值相同
+        "def f(xs):\n    for x in xs:\n        if x:\n            return True\n    return True",
+    ],
+    transform_nested_append: [
+        # 单层、无 if（由 transform_list_append 负责）
+        "def f(xs):\n    res = []\n    for x in xs:\n        res.append(x)\n    return res",
+        # 元素表达式里读结果列表
+        "def f(xs, ys):\n    res = []\n    for x in xs:\n        for y in ys:\n            res.append(len(res))\n    return res",
+        # append 到别的列表
+        "def f(xs, ys, o):\n    res = []\n    for x in xs:\n        for y in ys:\n            o.append(y)\n    return res",
+        # 循环变量在之后还被用到
+        "def f(xs, ys):\n    res = []\n    for x in xs:\n        for y in ys:\n            res.append(y)\n    return res, y",
+        # 中间层多于一条语句
+        "def f(xs, ys):\n    res = []\n    for x in xs:\n        t = x\n        for y in ys:\n            res.append(y)\n    return res",
+    ],
+    transform_range_len: [
+        # 下标赋值
+        "def f(xs):\n    xs = list(xs)\n    for i in range(len(xs)):\n        xs[i] = 0\n    return xs",
+        # xs 还有别的用法
+        "def f(xs):\n    xs = list(xs)\n    t = 0\n    for i in range(len(xs)):\n        t += xs[i] + len(xs)\n    return t",
+        # 下标不是循环变量
+        "def f(xs):\n    xs = list(xs)\n    t = 0\n    for i in range(len(xs)):\n        t += xs[i - 1]\n    return t",
+        # 循环变量被重新赋值
+        "def f(xs):\n    xs = list(xs)\n    t = 0\n    for i in range(len(xs)):\n        t += xs[i]\n        i = 0\n    return t",
+        # range 有起点
+        "def f(xs):\n    xs = list(xs)\n    t = 0\n    for i in range(1, len(xs)):\n        t += xs[i]\n    return t",
+        # 类型未知：int 键的 dict 上 d[i] 是值，enumerate 给的是键
+        "def f(d):\n    t = ''\n    for i in range(len(d)):\n        t += d[i]\n    return t",
+        # 列表之后又被重新绑定
+        "def f(xs, c):\n    xs = list(xs)\n    if c:\n        xs = c\n    t = 0\n    for i in range(len(xs)):\n        t += xs[i]\n    return t",
+    ],
+}
+
+@pytest.mark.parametrize("rule, src", [(r, s) for r, ss in NEGATIVE.items() for s in ss],
+                         ids=lambda v: getattr(v, "__name__", ""))
+def test_guard_rejects(rule, src):
+    assert matches(rule, src) == []
+    changed, new = rewrite(rule, src)
+    assert not changed and new == ast.unparse(ast.parse(src).body[0])
+
+def test_range_len_keeps_index_used_elsewhere():
+    changed, new = rewrite(transform_range_len,
+                           "def f(xs):\n    xs = tuple(xs)\n    t = 0\n    for i in range(len(xs)):\n        t += xs[i]\n    return t, i")
+    assert changed and "enumerate(xs)" in new
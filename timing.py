@@ -0,0 +1,98 @@
+"""
+timing.py  – 稳健计时
+auto-range 循环次数 + warmup + 多次 repeat，测量期间关闭 GC，取 median / IQR；
+compare() 用 Mann-Whitney U 精确检验判断加速是否真实。
+"""
+import gc, math, time, statistics
+from functools import lru_cache
+
+_clock = time.perf_counter
+_overhead = None
+
+class Timing:
+    """一次测量的结果；float(t) 即每次调用耗时的中位数（秒）。"""
+    def __init__(self, samples, loops, elapsed):
+        self.samples = samples                  # 每个 repeat 的单次调用耗时
+        self.loops = loops
+        self.elapsed = elapsed                  # 本次测量总耗时（含 warmup / autorange）
+        self.median = statistics.median(samples)
+        q = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+        self.iqr = q[2] - q[0]
+        self.overhead = overhead()              # 计时框架本身每次调用的开销
+
+    def __float__(self):
+        return self.median
+
+    def __repr__(self):
+        return (f"Timing(median={self.median:.3g}s, iqr={self.iqr:.2g}s, "
+                f"loops={self.loops}, n={len(self.samples)}, elapsed={self.elapsed:.3g}s)")
+
+def _run(fn, args, loops):
+    it = range(loops)
+    s = _clock()
+    for _ in it: fn(*args)
+    return _clock() - s
+
+def overhead():
+    """空函数调用 + 循环的单次开销，进程内只标定一次。"""
+    global _overhead
+    if _overhead is None:
+        noop = lambda *a: None
+        _overhead = min(_run(noop, (), 10000) for _ in range(3)) / 10000
+    return _overhead
+
+def _autorange(fn, args, min_time, max_loops):
+    loops = 1
+    while True:
+        for m in (1, 2, 5):
+            n = loops * m
+            t = _run(fn, args, n)
+            if t >= min_time or n >= max_loops: return n, t
+        loops *= 10
+
+def measure(fn, args=(), repeat=5, warmup=1, budget=0.02, max_loops=100000):
+    """
+    在约 budget 秒内测 fn(*args)：autorange 按每份 budget/(repeat+1) 秒定循环次数，
+    其余 repeat 平分 autorange 之后剩下的预算（试探的开销不固定）。
+    budget 是上限：总耗时（含 warmup）一超过 budget 就不再 repeat，至少保留一个样本；
+    单次调用就比 budget 慢时只有 1 个样本（warmup 那次），compare() 不会判它显著。
+    """
+    start = _clock()
+    gc_on = gc.isenabled(); gc.disable()
+    try:
+        for _ in range(warmup): t = _run(fn, args, 1)
+        if warmup and _clock() - start >= budget:
+            return Timing([t], 1, _clock() - start)
+        loops, t = _autorange(fn, args, budget / (repeat + 1), max_loops)
+        samples = [t / loops]
+        left = budget - (_clock() - start)
+        if repeat > 1 and left > 0:
+            loops = max(1, min(loops, int(left / (repeat - 1) / samples[0])))
+        for _ in range(repeat - 1):
+            if _clock() - start >= budget: break
+            samples.append(_run(fn, args, loops) / loops)
+    finally:
+        if gc_on: gc.enable()
+    return Timing(samples, loops, _clock() - start)
+
+# -------- 显著性 --------
+@lru_cache(maxsize=None)
+def _u_counts(n, m):
+    # U 统计量在 H0 下的排列计数，f(n,m)[u] = f(n-1,m)[u-m] + f(n,m-1)[u]
+    if n == 0 or m == 0: return (1,)
+    a, b = _u_counts(n - 1, m), _u_counts(n, m - 1)
+    return tuple((a[u - m] if 0 <= u - m < len(a) else 0) + (b[u] if u < len(b) else 0)
+                 for u in range(n * m + 1))
+
+def mann_whitney_p(x, y):
+    """双侧精确 p 值（有并列时按 0.5 计，偏保守）。"""
+    n, m = len(x), len(y)
+    u = sum((a > b) + 0.5 * (a == b) for a in x for b in y)
+    counts = _u_counts(n, m)
+    lo = math.floor(min(u, n * m - u))
+    return min(1.0, 2 * sum(counts[:lo + 1]) / sum(counts))
+
+def compare(prev: Timing, new: Timing, alpha=0.05):
+    """返回 (speedup, significant)；speedup = prev / new 的中位数之比。"""
+    speedup = prev.median / new.median if new.median > 0 else 1.0
+    return speedup, mann_whitney_p(prev.samples, new.samples) < alpha
@@ -1,73 +1,130 @@
 """
 train.py – REINFORCE + baseline + learned reward mix.
+n_envs 个 CodeOptimizeEnv 并行 rollout（VecCodeOptimizeEnv），每步一次批量 PolicyNet 前向；
+轨迹存在预分配的 RolloutBuffer 里，更新时整批一次前向。
 
+    python train.py                     # 从头训练
+    python train.py --resume            # 从 checkpoints/ 里最新的完整状态续训
+    python train.py --resume checkpoints/state_ep300.pt
 """
-import os, json, numpy as np, torch
-from env import CodeOptimizeEnv
-from policy import PolicyNet
-from functions import functions
+import argparse, json, sys, numpy as np, torch
+from collections import deque
+from torch.distributions import Categorical
+from vec_env import VecCodeOptimizeEnv
+from policy import PolicyNet, restore
+from rollout import RolloutBuffer
+from metrics import MetricsWriter, MetricsLog
+from functions import functions, cases
+from corpus import DictCorpus
+from transformation import ACTIONS
+import profiler, checkpoint
 
 # ------------------ 超参 ------------------
 cfg = dict(alpha=0.8, beta=0.2, max_steps=10,
            episodes=1000, pretrain=200,
            buffer=50, batch=20, lr=5e-4,
-           ckpt_interval=100)          
+           ckpt_interval=100, ckpt_keep=5, n_envs=4, sandbox=True,
+           rm_background=True,
+           profile=False,                 # True：按 episode 记录各阶段耗时 → profile.csv / .json
+           metrics="metrics.bin",         # 逐 episode 流式落盘：python metrics.py metrics.bin
+           experience="experience",       # 所有 transition 进磁盘经验库（experience.py）
+           corpus=None,                   # JSONL / 目录；None 用 functions.py
+           shard_corpus=False,            # 大语料时每个 worker 只抽自己那一片
+           scaling=False,                 # True：加上规模阶梯的复杂度指数 / 大规模加速奖励项
+           memory=True, w_mem=20.0,       # 峰值内存项：2 倍省 / 费内存与 2 倍加速 / 减速同权
+           cost_model=True,               # 静态字节码估计为默认奖励，估计变化大或抽中
+           cost_threshold=0.1, timing_frac=0.1)   # （timing_frac）时才真的计时
+
+def valid(M):
+    return M | ~M.any(1, keepdims=True)              # 全部不可用时退回不加 mask
+
+ap = argparse.ArgumentParser(description="REINFORCE training")
+ap.add_argument("--resume", nargs="?", const="latest",
+                help="续训的 state_ep*.pt；不给路径则用 checkpoints/ 里最新的")
+args = ap.parse_args()
 
 # ------------------ 初始化 ------------------
-env = CodeOptimizeEnv(functions, cfg)
-obs_dim, act_dim = env.reset().shape[0], 6
+env = VecCodeOptimizeEnv(cfg["corpus"] or DictCorpus(functions, cases), cfg)
+S, M = env.reset(), valid(env.action_masks())
+obs_dim, act_dim = S.shape[1], len(ACTIONS)
 policy = PolicyNet(obs_dim, act_dim)
 opt = torch.optim.Adam(policy.parameters(), lr=cfg["lr"])
 
-hist, batch = [], []
-os.makedirs("checkpoints", exist_ok=True)
+hist, prof_hist = deque(maxlen=50), []           # hist 只留打印用的最近 50 个，全量在 metrics 里
+heu_acc, lr_acc = np.zeros(env.n_envs), np.zeros(env.n_envs)
+buf = RolloutBuffer(env.n_envs, cfg["max_steps"], obs_dim, act_dim, cfg["batch"])
+ckpt = checkpoint.Checkpointer("checkpoints", cfg["ckpt_keep"])
+ep = 0
 
-# ------------------ 训练循环 ------------------
-for ep in range(cfg["episodes"]):
-    s, logs, ents, rs, done = env.reset(), [], [], [], False
-    while not done:
-        st = torch.tensor(s).float().unsqueeze(0)
-        probs = policy(st)[0]
-        a = np.random.choice(act_dim, p=probs.detach().numpy())
-        logs.append(torch.log(probs[a] + 1e-8))
-        ents.append(-(probs * torch.log(probs + 1e-8)).sum())
+# ------------------ 续训 ------------------
+# 进行中的 episode 不在 checkpoint 里：各 env 恢复 RNG / reward model 后重新 reset
+if args.resume:
+    path = checkpoint.latest("checkpoints") if args.resume == "latest" else args.resume
+    if path is None: sys.exit("no checkpoint to resume from")
+    st = checkpoint.load(path)
+    if restore(policy, opt, st):                # 动作数变了：缓冲里的 mask 形状也对不上，丢掉
+        buf.load_state_dict(st["buf"])
+    hist, prof_hist, ep = deque(st["hist"], maxlen=50), st["prof_hist"], st["ep"]
+    env.call_each("load_state_dict", [(d,) for d in st["envs"]])
+    torch.set_rng_state(st["torch_rng"])
+    S, M = env.reset(), valid(env.action_masks())
+    print(f"resumed from {path} at episode {ep}")
+log = MetricsWriter(cfg["metrics"], truncate_to=ep)   # 续训时丢掉 checkpoint 之后记的行
 
-        s, r, done, _ = env.step(a)
-        rs.append(r)
-
-    G = sum(rs)
-    hist.append(G)
-    batch.append((logs, ents, G))
+# ------------------ 训练循环 ------------------
+while ep < cfg["episodes"]:
+    with torch.no_grad():                           # 采样不建图，更新时一次前向重算 log-prob
+        A = Categorical(probs=policy(torch.as_tensor(S).float()) * torch.as_tensor(M)).sample()
+    S2, R, D, infos = env.step(A.numpy())
+    buf.add(S, M, A, R)
+    heu_acc += [info.get("heu", 0.0) for info in infos]
+    lr_acc += [info.get("lr", 0.0) for info in infos]
+    for i in np.flatnonzero(D):
+        if ep >= cfg["episodes"]:
+            buf.finish(i, keep=False); continue
+        G = buf.finish(i)
+        hist.append(G)
+        log.write(G, heu_acc[i], lr_acc[i], infos[i]["steps"], infos[i]["name"])
+        if "prof" in infos[i]: prof_hist.append(infos[i]["prof"])
 
-    #—— 训练 reward-model ————————————————
-    if ep >= cfg["pretrain"] and ep % cfg["buffer"] == 0:
-        env.rm.fit()
+        #—— 训练 reward-model ————————————————
+        if ep >= cfg["pretrain"] and ep % cfg["buffer"] == 0:
+            env.call("rm.fit")
 
-    #—— 更新策略 ————————————————
-    if (ep + 1) % cfg["batch"] == 0:
-        returns = [g for _, _, g in batch]
-        baseline = np.mean(returns)
-        advs = [g - baseline for g in returns]
-        loss = 0.0
-        for (logs, ents, _), adv in zip(batch, advs):
-            for lp, ent in zip(logs, ents):
-                loss += -lp * adv - 0.01 * ent
-        loss /= len(batch)
-        opt.zero_grad()
-        loss.backward()
-        opt.step()
-        batch.clear()
+        #—— 更新策略 ————————————————
+        if (ep + 1) % cfg["batch"] == 0:
+            o, m, a, ep_id, G = buf.batch()
+            adv = (G - G.mean())[ep_id]
+            dist = Categorical(probs=policy(o) * m)       # 与采样时相同的 masked 分布
+            loss = (-dist.log_prob(a) * adv - 0.01 * dist.entropy()).sum() / len(G)
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            buf.clear()
 
-    #—— 打印 & Checkpoint ————————————————
-    if (ep + 1) % 50 == 0:
-        print(f"[{ep+1}/{cfg['episodes']}] avg_R={np.mean(hist[-50:]):.2f}")
+        #—— 打印 & Checkpoint ————————————————
+        if (ep + 1) % 50 == 0:
+            print(f"[{ep+1}/{cfg['episodes']}] avg_R={np.mean(hist):.2f}")
+            if prof_hist: print(profiler.table(prof_hist[-50:]))
 
-    if (ep + 1) % cfg["ckpt_interval"] == 0:
-        ckpt_path = f"checkpoints/policy_ep{ep+1}.pt"
-        torch.save(policy.state_dict(), ckpt_path)
-        print(f"checkpoint saved → {ckpt_path}")
+        if (ep + 1) % cfg["ckpt_interval"] == 0:      # 快照后由后台线程写盘
+            log.flush()
+            ckpt_path = ckpt.save(ep + 1, dict(
+                policy=policy.state_dict(), opt=opt.state_dict(), buf=buf.state_dict(),
+                hist=list(hist), prof_hist=prof_hist, ep=ep + 1, envs=env.call("state_dict"),
+                torch_rng=torch.get_rng_state(), cfg=cfg))
+            print(f"checkpoint saved → {ckpt_path}")
+        ep += 1
+    heu_acc[D] = lr_acc[D] = 0.0
+    S, M = S2, valid(np.stack([info["mask"] for info in infos]))
+env.close()
+ckpt.close()
+log.close()
 
 # ------------------ 保存曲线 & 最终权重 ------------------
-json.dump(hist, open("learning_curve.json", "w"))
+json.dump(MetricsLog(cfg["metrics"]).column("ret").tolist(), open("learning_curve.json", "w"))
+if prof_hist:
+    json.dump(prof_hist, open("profile.json", "w"))
+    profiler.write_csv("profile.csv", prof_hist)
 torch.save(policy.state_dict(), "policy_final.pt")
 print("训练完成：learning_curve.json & policy_final.pt 已保存")
@@ -0,0 +1,165 @@
+"""
+train_ppo.py – PPO（clip 目标 + GAE + 多轮 minibatch）+ learned reward mix。
+与 train.py 共用 VecCodeOptimizeEnv / 奖励 / 语料；区别只在策略更新：
+每个 env 走 n_steps 步凑成一批 rollout，用 GAE 算优势，在这批数据上跑 epochs 轮 minibatch，
+env 步（exec + 计时）是最贵的部分，每条 transition 被用 epochs 次而不是 1 次。
+
+    python train_ppo.py                 # 从头训练
+    python train_ppo.py --resume        # 从 checkpoints_ppo/ 里最新的完整状态续训
+"""
+import argparse, json, sys, numpy as np, torch
+from collections import deque
+from torch.distributions import Categorical
+from policy import PolicyNet, restore
+from rollout import StepBuffer
+from transformation import ACTIONS
+
+# ------------------ 超参 ------------------
+cfg = dict(alpha=0.8, beta=0.2, max_steps=10,
+           episodes=1000, pretrain=200,
+           buffer=50, lr=3e-4,
+           n_steps=64,                    # 每个 env 每批 rollout 的步数
+           epochs=4, minibatch=64,        # 每批数据上的轮数 / minibatch 大小
+           clip=0.2, gamma=0.99, lam=0.95,
+           vf_coef=0.5, ent_coef=0.01, max_grad_norm=0.5,
+           ckpt_interval=100, ckpt_keep=5, n_envs=4, sandbox=True,
+           rm_background=True,
+           metrics="metrics_ppo.bin",
+           experience="experience",
+           corpus=None, shard_corpus=False,
+           scaling=False,
+           memory=True, w_mem=20.0,
+           cost_model=True, cost_threshold=0.1, timing_frac=0.1)
+
+def valid(M):
+    return M | ~M.any(1, keepdims=True)              # 全部不可用时退回不加 mask
+
+@torch.no_grad()
+def act(policy, S, M):
+    """批量采样：(动作, masked 分布下的 log-prob, 价值)。"""
+    probs, v = policy.heads(torch.as_tensor(S).float())
+    dist = Categorical(probs=probs * torch.as_tensor(M))
+    A = dist.sample()
+    return A, dist.log_prob(A), v
+
+def ppo_update(policy, opt, buf, last_val, cfg):
+    """在 buf 上跑 cfg["epochs"] 轮 minibatch 的 clip 目标更新，返回最后一轮的平均损失项。"""
+    adv, ret = buf.gae(last_val, cfg["gamma"], cfg["lam"])
+    o, m, a, logp_old, adv, ret = buf.flat(adv, ret)
+    n, stats = len(a), {}
+    for _ in range(cfg["epochs"]):
+        sums = np.zeros(4)
+        for idx in torch.randperm(n).split(cfg["minibatch"]):
+            probs, v = policy.heads(o[idx])
+            dist = Categorical(probs=probs * m[idx])   # 与采样时相同的 masked 分布
+            ratio = torch.exp(dist.log_prob(a[idx]) - logp_old[idx])
+            A = adv[idx]
+            A = (A - A.mean()) / (A.std() + 1e-8) if len(idx) > 1 else A
+            pg = -torch.min(ratio * A, ratio.clamp(1 - cfg["clip"], 1 + cfg["clip"]) * A).mean()
+            vf = ((v - ret[idx]) ** 2).mean()
+            ent = dist.entropy().mean()
+            loss = pg + cfg["vf_coef"] * vf - cfg["ent_coef"] * ent
+            opt.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), cfg["max_grad_norm"])
+            opt.step()
+            sums += [pg.item(), vf.item(), ent.item(), 1]
+        stats = dict(zip(("pg", "vf", "ent"), sums[:3] / sums[3]))
+    buf.clear()
+    return stats
+
+def main():
+    from vec_env import VecCodeOptimizeEnv
+    from metrics import MetricsWriter, MetricsLog
+    from functions import functions, cases
+    from corpus import DictCorpus
+    import profiler, checkpoint
+
+    ap = argparse.ArgumentParser(description="PPO training")
+    ap.add_argument("--resume", nargs="?", const="latest",
+                    help="续训的 state_ep*.pt；不给路径则用 checkpoints_ppo/ 里最新的")
+    args = ap.parse_args()
+
+    # ------------------ 初始化 ------------------
+    env = VecCodeOptimizeEnv(cfg["corpus"] or DictCorpus(functions, cases), cfg)
+    S, M = env.reset(), valid(env.action_masks())
+    obs_dim, act_dim = S.shape[1], len(ACTIONS)
+    policy = PolicyNet(obs_dim, act_dim, value=True)
+    opt = torch.optim.Adam(policy.parameters(), lr=cfg["lr"])
+
+    hist, prof_hist = deque(maxlen=50), []
+    ret_acc, heu_acc, lr_acc = (np.zeros(env.n_envs) for _ in range(3))
+    buf = StepBuffer(cfg["n_steps"], env.n_envs, obs_dim, act_dim)
+    ckpt = checkpoint.Checkpointer("checkpoints_ppo", cfg["ckpt_keep"])
+    ep = last_ckpt = 0
+
+    # ------------------ 续训 ------------------
+    # checkpoint 只在更新之后存：rollout 缓冲是空的，进行中的 episode 重新 reset
+    if args.resume:
+        path = checkpoint.latest("checkpoints_ppo") if args.resume == "latest" else args.resume
+        if path is None: sys.exit("no checkpoint to resume from")
+        st = checkpoint.load(path)
+        restore(policy, opt, st)                     # 与 train.py 同一套：旧 checkpoint 动作少时补齐
+        hist, prof_hist, ep = deque(st["hist"], maxlen=50), st["prof_hist"], st["ep"]
+        last_ckpt = ep
+        env.call_each("load_state_dict", [(d,) for d in st["envs"]])
+        torch.set_rng_state(st["torch_rng"])
+        S, M = env.reset(), valid(env.action_masks())
+        print(f"resumed from {path} at episode {ep}")
+    log = MetricsWriter(cfg["metrics"], truncate_to=ep)
+
+    # ------------------ 训练循环 ------------------
+    while ep < cfg["episodes"]:
+        A, logp, V = act(policy, S, M)
+        S2, R, D, infos = env.step(A.numpy())
+        buf.add(S, M, A, logp, R, D, V)
+        ret_acc += R
+        heu_acc += [info.get("heu", 0.0) for info in infos]
+        lr_acc += [info.get("lr", 0.0) for info in infos]
+        for i in np.flatnonzero(D):
+            if ep >= cfg["episodes"]: continue
+            hist.append(ret_acc[i])
+            log.write(ret_acc[i], heu_acc[i], lr_acc[i], infos[i]["steps"], infos[i]["name"])
+            if "prof" in infos[i]: prof_hist.append(infos[i]["prof"])
+
+            #—— 训练 reward-model ————————————————
+            if ep >= cfg["pretrain"] and ep % cfg["buffer"] == 0:
+                env.call("rm.fit")
+
+            #—— 打印 ————————————————
+            if (ep + 1) % 50 == 0:
+                print(f"[{ep+1}/{cfg['episodes']}] avg_R={np.mean(hist):.2f}")
+                if prof_hist: print(profiler.table(prof_hist[-50:]))
+            ep += 1
+        ret_acc[D] = heu_acc[D] = lr_acc[D] = 0.0
+        S, M = S2, valid(np.stack([info["mask"] for info in infos]))
+
+        #—— 更新策略 ————————————————
+        if buf.full() or ep >= cfg["episodes"]:
+            with torch.no_grad():
+                last_val = policy.heads(torch.as_tensor(S).float())[1]
+            ppo_update(policy, opt, buf, last_val, cfg)
+
+            #—— Checkpoint ————————————————
+            if ep // cfg["ckpt_interval"] > last_ckpt // cfg["ckpt_interval"]:
+                log.flush()
+                ckpt_path = ckpt.save(ep, dict(
+                    policy=policy.state_dict(), opt=opt.state_dict(),
+                    hist=list(hist), prof_hist=prof_hist, ep=ep, envs=env.call("state_dict"),
+                    torch_rng=torch.get_rng_state(), cfg=cfg))
+                last_ckpt = ep
+                print(f"checkpoint saved → {ckpt_path}")
+    env.close()
+    ckpt.close()
+    log.close()
+
+    # ------------------ 保存曲线 & 最终权重 ------------------
+    json.dump(MetricsLog(cfg["metrics"]).column("ret").tolist(), open("learning_curve_ppo.json", "w"))
+    if prof_hist:
+        json.dump(prof_hist, open("profile_ppo.json", "w"))
+        profiler.write_csv("profile_ppo.csv", prof_hist)
+    torch.save(policy.state_dict(), "policy_ppo_final.pt")
+    print("训练完成：learning_curve_ppo.json & policy_ppo_final.pt 已保存")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+vec_env.py  – VecCodeOptimizeEnv
+N 个 CodeOptimizeEnv 各跑在一个子进程里，批量 reset() / step(actions)，
+done 时自动 reset（终局 obs 放在 info["terminal_obs"]，info["mask"] 总是对应返回的 obs）。
+"""
+import atexit, functools, multiprocessing as mp, random, numpy as np
+from env import CodeOptimizeEnv
+
+def _worker(remote, parent, funcs, cfg, seed, shard):
+    parent.close()
+    random.seed(seed); np.random.seed(seed)     # fork 后各 worker 抽样序列不同
+    env = CodeOptimizeEnv(funcs, cfg, shard)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, r, done, info = env.step(data)
+                info = dict(info, name=env.name, steps=env.steps)
+                if done:
+                    info["terminal_obs"] = obs
+                    obs = env.reset()
+                    info["mask"] = env.action_mask()    # 新 episode 的 mask
+                remote.send((obs, r, done, info))
+            elif cmd == "reset":
+                remote.send(env.reset())
+            elif cmd == "call":
+                path, args = data
+                remote.send(functools.reduce(getattr, path.split("."), env)(*args))
+            elif cmd == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        env.close()
+        remote.close()
+
+class VecCodeOptimizeEnv:
+    def __init__(self, funcs, cfg, n_envs=None, seed=0, start_method=None):
+        self.n_envs = n_envs or cfg.get("n_envs", 1)
+        method = start_method or ("fork" if "fork" in mp.get_all_start_methods() else None)
+        ctx = mp.get_context(method)
+        self.remotes, self.procs, self.closed = [], [], False
+        for i in range(self.n_envs):
+            remote, child = ctx.Pipe()
+            # 非 daemon：worker 里的 env 可能还要起自己的 EvalPool 子进程
+            shard = (i, self.n_envs) if cfg.get("shard_corpus") else None   # 大语料按 worker 切片
+            p = ctx.Process(target=_worker, args=(child, remote, funcs, cfg, seed + i, shard))
+            p.start(); child.close()
+            self.remotes.append(remote); self.procs.append(p)
+        atexit.register(self.close)
+
+    # -------- RL interface --------
+    def reset(self):
+        for r in self.remotes: r.send(("reset", None))
+        return np.stack([r.recv() for r in self.remotes])
+
+    def step(self, actions):
+        for r, a in zip(self.remotes, actions): r.send(("step", int(a)))
+        obs, rews, dones, infos = zip(*[r.recv() for r in self.remotes])
+        return (np.stack(obs), np.asarray(rews, dtype=np.float32),
+                np.asarray(dones, dtype=bool), list(infos))
+
+    def action_masks(self):
+        return np.stack(self.call("action_mask"))
+
+    def call(self, path, *args):
+        """在每个 worker 的 env 上调用 path（如 "rm.fit"），返回结果列表。"""
+        for r in self.remotes: r.send(("call", (path, args)))
+        return [r.recv() for r in self.remotes]
+
+    def call_each(self, path, args):
+        """worker i 上调用 path(*args[i])，如恢复各自的 state_dict。"""
+        for r, a in zip(self.remotes, args): r.send(("call", (path, a)))
+        return [r.recv() for r in self.remotes]
+
+    def close(self):
+        if self.closed: return
+        for r in self.remotes:
+            try: r.send(("close", None))
+            except (BrokenPipeError, EOFError): pass
+        for p in self.procs:
+            p.join(timeout=1)
+            if p.is_alive(): p.terminate()
+        self.closed = True
+
+    def __del__(self):
+        self.close()